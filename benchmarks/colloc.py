@@ -0,0 +1,38 @@
+"""Collocation extraction time per token for growing sentence lengths."""
+
+import argparse
+import random
+from timeit import timeit
+
+from synthetic import sentence
+
+from zdl_nlp.colloc import extract_collocs
+
+arg_parser = argparse.ArgumentParser(description="Benchmark collocation extraction")
+arg_parser.add_argument(
+    "-n", "--repeat", help="# of sentences per length (50 by default)", type=int
+)
+arg_parser.add_argument(
+    "-l",
+    "--length",
+    help="sentence lengths to benchmark",
+    type=int,
+    nargs="*",
+    default=(10, 20, 50, 100, 200, 500),
+)
+
+
+def main():
+    args = arg_parser.parse_args()
+    repeat = args.repeat or 50
+    rng = random.Random(0)
+    print(f"{'tokens':>8s} {'µs/sentence':>14s} {'µs/token':>10s}")
+    for length in args.length:
+        sentences = [sentence(length, rng) for _ in range(repeat)]
+        t = timeit(lambda s=sentences: [extract_collocs(s) for s in s], number=1)
+        t_s = t / repeat * 1e6
+        print(f"{length:>8d} {t_s:>14.1f} {t_s / length:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
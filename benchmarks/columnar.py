@@ -0,0 +1,61 @@
+"""Size and read times of columnar archives, compared to (gzipped) CoNLL-U."""
+
+import argparse
+import gzip
+import io
+import random
+import tempfile
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+
+from synthetic import corpus
+
+from zdl_nlp import columnar
+from zdl_nlp.conllu import parse_incr, read_blocks, serialize
+
+arg_parser = argparse.ArgumentParser(description="Benchmark columnar archives")
+arg_parser.add_argument(
+    "-n", "--sentences", help="# of sentences (20000 by default)", type=int
+)
+
+
+def timed(label, f):
+    start = perf_counter()
+    f()
+    print(f"{label:>32s} {perf_counter() - start:>8.2f}s")
+
+
+def main():
+    args = arg_parser.parse_args()
+    sentences = corpus(args.sentences or 20000, random.Random(0))
+    data = "".join(serialize(s) for s in sentences)
+    compressed = gzip.compress(data.encode("utf-8"))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive_file = Path(tmp_dir) / "corpus.columns"
+        with archive_file.open("wb") as f:
+            columnar.write(read_blocks(io.StringIO(data)), f)
+        size = archive_file.stat().st_size
+        print(f"{'CoNLL-U':>32s} {len(data.encode('utf-8')):>12,d} bytes")
+        print(f"{'CoNLL-U (gzip)':>32s} {len(compressed):>12,d} bytes")
+        print(f"{'archive':>32s} {size:>12,d} bytes")
+
+        def conllu_sentences():
+            return parse_incr(io.StringIO(gzip.decompress(compressed).decode()))
+
+        with columnar.Archive(archive_file) as archive:
+            timed(
+                "lemma counts (CoNLL-U, gzip)",
+                lambda: Counter(t["lemma"] for s in conllu_sentences() for t in s),
+            )
+            timed("lemma counts (archive)", lambda: Counter(archive.scan("lemma")))
+            timed("sentences (CoNLL-U, gzip)", lambda: list(conllu_sentences()))
+            timed("sentences (archive)", lambda: list(archive.sentences()))
+            timed(
+                "to CoNLL-U (archive)",
+                lambda: columnar.to_conllu(archive, io.StringIO()),
+            )
+
+
+if __name__ == "__main__":
+    main()
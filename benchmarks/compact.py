@@ -0,0 +1,71 @@
+"""Memory and processing time of compact sentences, compared to token dicts."""
+
+import argparse
+import io
+import random
+import tracemalloc
+from functools import partial
+from time import perf_counter
+
+from synthetic import corpus
+
+from zdl_nlp.colloc import extract_collocs
+from zdl_nlp.conllu import parse, parse_block, read_docs, serialize, text
+
+arg_parser = argparse.ArgumentParser(description="Benchmark compact sentences")
+arg_parser.add_argument(
+    "-n", "--sentences", help="# of sentences (10000 by default)", type=int
+)
+arg_parser.add_argument("--solr", help="Include Solr conversion", action="store_true")
+
+
+def allocated(f):
+    tracemalloc.start()
+    result = f()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(f, sentences):
+    start = perf_counter()
+    f(sentences)
+    return perf_counter() - start
+
+
+def main():
+    args = arg_parser.parse_args()
+    data = "".join(
+        serialize(s) for s in corpus(args.sentences or 10000, random.Random(0))
+    )
+    stages = {
+        "colloc": lambda sentences: [extract_collocs(s) for s in sentences],
+        "text": lambda sentences: [text(s) for s in sentences],
+        "serialize": lambda sentences: [serialize(s) for s in sentences],
+    }
+    if args.solr:
+        from zdl_nlp import solr
+
+        docs = list(read_docs(io.StringIO(data)))
+        stages["solr"] = lambda sentences: sum(
+            map(len, solr.xml_add(solr.update_docs(docs)))
+        )
+    print(f"{'':>10s} {'MiB/1M tokens':>14s} {'parse':>8s}", end="")
+    print("".join(f" {stage:>10s}" for stage in stages))
+    for compact in (False, True):
+        start = perf_counter()
+        parse(data, compact)
+        parse_t = perf_counter() - start
+        sentences, size = allocated(lambda compact=compact: parse(data, compact))
+        n_tokens = sum(len(s) for s in sentences)
+        size_m = size / n_tokens * 1e6 / 2**20
+        if args.solr:
+            # documents are parsed when indexed
+            solr.parse_block = partial(parse_block, compact=compact)
+        label = "compact" if compact else "dict"
+        print(f"{label:>10s} {size_m:>14,.0f} {parse_t:>7.2f}s", end="")
+        print("".join(f" {timed(f, sentences):>9.2f}s" for f in stages.values()))
+
+
+if __name__ == "__main__":
+    main()
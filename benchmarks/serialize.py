@@ -0,0 +1,63 @@
+"""Throughput of CoNLL-U serialization, compared to the generic serializer."""
+
+import argparse
+import io
+import random
+from timeit import repeat
+
+from conllu.parser import DEFAULT_FIELDS
+from conllu.serializer import serialize_field
+from synthetic import corpus
+
+from zdl_nlp.conllu import serialize, write
+
+arg_parser = argparse.ArgumentParser(description="Benchmark CoNLL-U serialization")
+arg_parser.add_argument(
+    "-n", "--sentences", help="# of sentences (10000 by default)", type=int
+)
+
+
+def generic_serialize(sentence):
+    """Serialization via conllu's field serializer, as before."""
+    lines = []
+
+    if sentence.metadata:
+        for key, value in sentence.metadata.items():
+            if value:
+                line = f"# {key} = {value}"
+            else:
+                line = f"# {key}"
+            lines.append(line)
+
+    for token in sentence:
+        line = "\t".join(serialize_field(token.get(k)) for k in DEFAULT_FIELDS)
+        lines.append(line)
+
+    return "\n".join(lines) + "\n\n"
+
+
+def generic_write(sentences, f):
+    for s in sentences:
+        f.write(generic_serialize(s))
+
+
+def main():
+    args = arg_parser.parse_args()
+    sentences = corpus(args.sentences or 10000, random.Random(0))
+    for s in sentences:
+        s.metadata["collocations"] = '[["ADV", 2, 4], ["ATTR", 8, 7]]'
+        s.metadata["gdex"] = "0.5"
+    assert all(serialize(s) == generic_serialize(s) for s in sentences)
+    n = len(sentences)
+    for name, f in (
+        ("generic", lambda: [generic_serialize(s) for s in sentences]),
+        ("specialized", lambda: [serialize(s) for s in sentences]),
+        ("generic (file)", lambda: generic_write(sentences, io.StringIO())),
+        ("specialized (file)", lambda: write(sentences, io.StringIO())),
+    ):
+        t = min(repeat(f, number=1, repeat=5))
+        print(f"{name:>24s} {n / t:>12,.0f} sentences/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Parsing throughput with and without length-sorted batches."""
+
+import argparse
+import random
+from time import perf_counter
+
+import spacy
+from synthetic import corpus
+
+from zdl_nlp.annotate import spacy_pipe
+from zdl_nlp.conllu import serialize
+
+arg_parser = argparse.ArgumentParser(description="Benchmark length-sorted batching")
+arg_parser.add_argument(
+    "-m", "--model", help="spaCy model (de_zdl_lg by default)", default="de_zdl_lg"
+)
+arg_parser.add_argument(
+    "-n", "--sentences", help="# of sentences (10000 by default)", type=int
+)
+arg_parser.add_argument(
+    "-b", "--batch-size", help="spaCy batch size (128 by default)", type=int
+)
+arg_parser.add_argument(
+    "-w",
+    "--sort-window",
+    help="sort windows to compare (0 = unsorted)",
+    type=int,
+    nargs="*",
+    default=(0, 1024, 8192),
+)
+
+
+def main():
+    args = arg_parser.parse_args()
+    nlp = spacy.load(args.model)
+    batch_size = args.batch_size or 128
+    baseline = None
+    for sort_window in args.sort_window:
+        # fresh sentences per run, so annotations of a previous run cannot
+        # make outputs look identical
+        sentences = corpus(args.sentences or 10000, random.Random(0))
+        n_tokens = sum(len(s) for s in sentences)
+        start = perf_counter()
+        output = "".join(
+            serialize(s)
+            for s in spacy_pipe(nlp, sentences, batch_size, sort_window=sort_window)
+        )
+        elapsed = perf_counter() - start
+        baseline = baseline or output
+        print(
+            f"window={sort_window:>6d} "
+            f"{len(sentences) / elapsed:>10.1f} sentences/s "
+            f"{n_tokens / elapsed:>10.1f} tokens/s "
+            f"identical={output == baseline}"
+        )
+
+
+if __name__ == "__main__":
+    main()
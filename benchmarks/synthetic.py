@@ -0,0 +1,66 @@
+"""Synthetic, annotated sentences for benchmarking."""
+
+import random
+
+from conllu.models import Token, TokenList
+
+_vocab = (
+    ("Haus", "NOUN", "NN", "nmod", {"Case": "Gen", "Gender": "Neut"}),
+    ("Tag", "NOUN", "NN", "nsubj", {"Case": "Nom", "Gender": "Masc"}),
+    ("Folge", "NOUN", "NN", "obj", {"Case": "Acc", "Gender": "Fem"}),
+    ("Meer", "NOUN", "NN", "obl", {"Case": "Dat", "Gender": "Neut"}),
+    ("sehen", "VERB", "VVFIN", "conj", {"VerbForm": "Fin"}),
+    ("halten", "VERB", "VVINF", "xcomp", {"VerbForm": "Inf"}),
+    ("werden", "AUX", "VAFIN", "aux:pass", {"VerbForm": "Fin"}),
+    ("sein", "AUX", "VAFIN", "cop", {"VerbForm": "Fin"}),
+    ("ganz", "ADJ", "ADJA", "amod", {"Degree": "Pos"}),
+    ("schnell", "ADJ", "ADJD", "advmod", {"Degree": "Pos"}),
+    ("sehr", "ADV", "ADV", "advmod", None),
+    ("mehr", "ADV", "ADV", "advmod", None),
+    ("an", "ADP", "APPR", "case", {"AdpType": "Prep"}),
+    ("als", "CCONJ", "KOKOM", "case", None),
+    ("und", "CCONJ", "KON", "cc", None),
+    ("die", "DET", "ART", "det", {"Definite": "Def"}),
+    ("er", "PRON", "PPER", "nsubj", {"Case": "Nom"}),
+    (",", "PUNCT", "$,", "punct", None),
+)
+
+
+def sentence(n, rng=random):
+    """Creates a sentence of length n with a random, mostly local tree."""
+    root = rng.randrange(n)
+    tokens = []
+    for ti in range(n):
+        lemma, upos, xpos, deprel, feats = rng.choice(_vocab)
+        if ti == root:
+            head, deprel = 0, "root"
+        else:
+            head = min(max(ti + rng.choice((-3, -2, -1, 1, 2, 3)), 0), n - 1)
+            head = root if head == ti else head
+            head += 1
+        tokens.append(
+            Token(
+                {
+                    "id": ti + 1,
+                    "form": lemma,
+                    "lemma": lemma,
+                    "upos": upos,
+                    "xpos": xpos,
+                    "feats": dict(feats) if feats else None,
+                    "head": head,
+                    "deprel": deprel,
+                    "deps": None,
+                    "misc": None if rng.random() < 0.9 else {"SpaceAfter": "No"},
+                }
+            )
+        )
+    return TokenList(tokens, {"newdoc id": "urn:synthetic"})
+
+
+def sentence_length(rng=random):
+    """Draws from a long-tailed distribution, resembling corpus sentences."""
+    return max(1, min(int(rng.lognormvariate(2.7, 0.7)), 500))
+
+
+def corpus(n_sentences, rng=random):
+    return [sentence(sentence_length(rng), rng) for _ in range(n_sentences)]
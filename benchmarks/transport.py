@@ -0,0 +1,61 @@
+"""Size and (un-)pickling time of sentence batches passed to/from workers."""
+
+import argparse
+import pickle
+import random
+from timeit import repeat
+
+from conllu.models import Token, TokenList
+from synthetic import corpus
+
+from zdl_nlp.conllu import pack_sentences, unpack_sentences
+
+arg_parser = argparse.ArgumentParser(description="Benchmark worker transport")
+arg_parser.add_argument(
+    "-n", "--sentences", help="# of sentences (10000 by default)", type=int
+)
+arg_parser.add_argument(
+    "-b", "--batch-size", help="sentences per batch (128 by default)", type=int
+)
+
+
+def segmented(s):
+    """Sentence as passed to workers, before annotation."""
+    return TokenList(
+        [Token({"id": t["id"], "form": t["form"], "misc": t["misc"]}) for t in s],
+        s.metadata,
+    )
+
+
+def best_of(f, n):
+    return min(repeat(f, number=1, repeat=5)) / n * 1e6
+
+
+def main():
+    args = arg_parser.parse_args()
+    batch_size = args.batch_size or 128
+    annotated = corpus(args.sentences or 10000, random.Random(0))
+    n = len(annotated)
+    print(f"{'':>24s} {'bytes/sent.':>12s} {'dump µs/s.':>11s} {'load µs/s.':>11s}")
+    for name, sentences in (
+        ("input", [segmented(s) for s in annotated]),
+        ("output", annotated),
+    ):
+        batches = [sentences[i : i + batch_size] for i in range(0, n, batch_size)]
+        for codec, encode, decode in (
+            ("pickle", lambda b: b, lambda b: b),
+            ("packed", pack_sentences, unpack_sentences),
+        ):
+            dumps = [pickle.dumps(encode(b)) for b in batches]
+            assert [decode(pickle.loads(d)) for d in dumps] == batches
+            size = sum(len(d) for d in dumps) / n
+            dump_t = best_of(lambda: [pickle.dumps(encode(b)) for b in batches], n)
+            load_t = best_of(lambda: [decode(pickle.loads(d)) for d in dumps], n)
+            print(
+                f"{name + ' (' + codec + ')':>24s} "
+                f"{size:>12.1f} {dump_t:>11.1f} {load_t:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Startup time and memory of worker pools per start method."""
+
+import argparse
+import multiprocessing
+import random
+from time import perf_counter
+
+from conllu.models import Token, TokenList
+from synthetic import corpus
+
+import zdl_nlp.annotate as annotate
+from zdl_nlp.conllu import pack_sentences
+
+arg_parser = argparse.ArgumentParser(description="Benchmark worker start methods")
+arg_parser.add_argument(
+    "-p", "--parallel", help="# of workers (4 by default)", type=int, default="4"
+)
+arg_parser.add_argument(
+    "-n", "--sentences", help="# of warm-up sentences (2048 by default)", type=int
+)
+
+
+def memory(pid):
+    """Resident (RSS), proportional (PSS) and unique (USS) memory in MiB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            k, *v = line.split()
+            if v and v[-1] == "kB":
+                values[k.rstrip(":")] = int(v[0]) / 1024
+    return (
+        values["Rss"],
+        values["Pss"],
+        values["Private_Clean"] + values["Private_Dirty"],
+    )
+
+
+def segmented(s):
+    return TokenList(
+        [Token({"id": t["id"], "form": t["form"], "misc": t["misc"]}) for t in s],
+        s.metadata,
+    )
+
+
+def report(label, pids):
+    usage = [memory(pid) for pid in pids]
+    rss, pss, uss = (sum(u[i] for u in usage) / len(usage) for i in range(3))
+    print(f"{label:>28s} {rss:>10.1f} {pss:>10.1f} {uss:>10.1f}")
+
+
+def main():
+    args = arg_parser.parse_args()
+    sentences = [segmented(s) for s in corpus(args.sentences or 2048, random.Random(0))]
+    batches = [
+        pack_sentences(sentences[i : i + 128]) for i in range(0, len(sentences), 128)
+    ]
+    print(f"{'MiB per worker':>28s} {'RSS':>10s} {'PSS':>10s} {'USS':>10s}")
+    for start_method in ("spawn", "forkserver"):
+        p = annotate.Pipeline(n_procs=args.parallel, start_method=start_method)
+        start = perf_counter()
+        pool = annotate.worker_pool(p, args.parallel)
+        # about one batch per worker, waiting for pipelines to be initialized
+        pool.map(annotate.annotate_batch, batches[: args.parallel], chunksize=1)
+        startup = perf_counter() - start
+        pids = [w.pid for w in pool._pool]
+        report(f"{start_method} (startup {startup:.1f}s)", pids)
+        pool.map(annotate.annotate_batch, batches, chunksize=1)
+        report(f"{start_method} (warm)", pids)
+        if start_method == "forkserver":
+            server_pid = multiprocessing.forkserver._forkserver._forkserver_pid
+            report("fork server", (server_pid,))
+        pool.terminate()
+        pool.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import gzip
+import queue
+import random
+import sqlite3
+from contextlib import closing
+
+from zdl_nlp.corpora import bgzf
+from zdl_nlp.corpora.manifest import find_document, read_document, write_manifest
+
+
+def documents(n, rng):
+    """Texts of varying size, hardly compressible to span several blocks."""
+    sizes = [rng.choice((10, 1_000, 30_000)) for _ in range(n)] + [150_000]
+    return [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyzäöü \n") for _ in range(size))
+        for size in sizes
+    ]
+
+
+def write(path, docs):
+    with path.open("wb") as f, bgzf.Writer(f) as w:
+        return [w.write(doc) for doc in docs]
+
+
+def test_block_compression(tmp_path):
+    path = tmp_path / "bucket.conll.gz"
+    docs = documents(40, random.Random(0))
+    locations = write(path, docs)
+    assert gzip.decompress(path.read_bytes()).decode("utf-8") == "".join(docs)
+    with path.open("rb") as f:
+        offsets = list(bgzf.block_offsets(f))
+        assert len(offsets) > 10
+        for doc, (offset, size) in zip(docs, locations):
+            assert size == len(doc.encode("utf-8"))
+            assert bgzf.read(f, offset, size) == doc
+        for n in (1, 3, 7, len(offsets) + 1):
+            ranges = bgzf.split(f, n)
+            assert len(ranges) <= n
+            assert "".join(bgzf.decompress(f, *r) for r in ranges) == "".join(docs)
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "bucket.conll.gz"
+    write(path, [])
+    assert gzip.decompress(path.read_bytes()) == b""
+
+
+def test_manifest(tmp_path):
+    docs = documents(3, random.Random(1))
+    imports = {}
+    q = queue.Queue()
+    for import_path in ("a.conll.gz", "b.conll.gz"):
+        imports[import_path] = write(tmp_path / import_path, docs)
+        for doc_id, (offset, size) in enumerate(imports[import_path]):
+            q.put((f"urn:{doc_id}", f"{doc_id}.xml", import_path, offset, size))
+    # a source file with two documents, interleaved with another one
+    # repeating the ID of its first document
+    imports["c.conll.gz"] = write(tmp_path / "c.conll.gz", docs)
+    for doc_id, path, (offset, size) in zip(
+        ("urn:c0", "urn:c0", "urn:c1"),
+        ("c.xml", "d.xml", "c.xml"),
+        imports["c.conll.gz"],
+    ):
+        q.put((doc_id, path, "c.conll.gz", offset, size))
+    q.put(None)
+    write_manifest(str(tmp_path / "manifest.db"), q)
+
+    with closing(sqlite3.connect(tmp_path / "manifest.db")) as db:
+        assert find_document(db, "urn:1") == ("b.conll.gz", [imports["b.conll.gz"][1]])
+        assert find_document(db, path="2.xml")[0] == "b.conll.gz"
+        assert find_document(db, "urn:4") is None
+    assert read_document(tmp_path, "urn:2") == docs[2]
+    assert read_document(tmp_path, path="c.xml") == docs[0] + docs[2]
+    assert read_document(tmp_path, "urn:c0") == docs[0] + docs[1]
+    assert read_document(tmp_path, path="4.xml") is None
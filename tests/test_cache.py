@@ -0,0 +1,118 @@
+from zdl_nlp.annotate import cached_pipe, create_pipe
+from zdl_nlp.annotate.cache import AnnotationCache
+from zdl_nlp.conllu import parse, serialize
+
+annotated = parse("""\
+# text = Sie schläft ein.
+# lang = de
+# collocations = [["SUBJA", 2, 1]]
+1	Sie	sie	PRON	PPER	Case=Nom	2	nsubj	_	_
+2	schläft	schlafen	VERB	VVFIN	_	0	root	_	CompoundPrt=3|CompoundVerb=einschlafen
+3	ein	ein	ADP	PTKVZ	_	2	compound:prt	_	SpaceAfter=No|DWDSmor=No
+4	.	.	PUNCT	$.	_	2	punct	_	_
+
+# text = Es regnet.
+1	Es	es	PRON	PPER	_	2	expl	_	_
+2	regnet	regnen	VERB	VVFIN	_	0	root	_	SpaceAfter=No
+3	.	.	PUNCT	$.	_	2	punct	_	_
+
+""")
+
+source = """\
+# text = Sie schläft ein.
+1	Sie	_	_	_	_	_	_	_	_
+2	schläft	_	_	_	_	_	_	_	_
+3	ein	_	_	_	_	_	_	_	SpaceAfter=No
+4	.	_	_	_	_	_	_	_	_
+
+# text = Es regnet.
+1	Es	_	_	_	_	_	_	_	_
+2	regnet	_	_	_	_	_	_	_	SpaceAfter=No
+3	.	_	_	_	_	_	_	_	_
+
+"""
+
+
+def test_cache_lookup(tmp_path):
+    cache = AnnotationCache(tmp_path / "cache.db", 16, "v1", flush_size=16)
+    assert cache.get(parse(source)) == [False, False]
+    cache.put(annotated[0])
+    # pending annotations are found before being flushed
+    sentences = parse(source)
+    assert cache.get(sentences) == [True, False]
+    assert serialize(sentences[0]) == serialize(annotated[0])
+    cache.put(annotated[1])
+    cache.close()
+
+    cache = AnnotationCache(tmp_path / "cache.db", 16, "v1")
+    sentences = parse(source)
+    assert cache.get(sentences) == [True, True]
+    assert [serialize(s) for s in sentences] == [serialize(s) for s in annotated]
+    assert cache.take_stats() == {"hits": 2, "misses": 0, "evictions": 0}
+    cache.close()
+
+    # annotations of another pipeline version
+    cache = AnnotationCache(tmp_path / "cache.db", 16, "v2")
+    assert cache.get(parse(source)) == [False, False]
+    cache.close()
+
+
+def test_cache_eviction(tmp_path):
+    cache = AnnotationCache(tmp_path / "cache.db", 1, "v1", flush_size=1)
+    cache.put(annotated[0])
+    cache.put(annotated[1])
+    assert cache.get(parse(source)) == [False, True]
+    assert cache.take_stats()["evictions"] == 1
+    cache.close()
+
+
+class FakeCache:
+    def __init__(self, keys):
+        self.keys = set(keys)
+        self.put_keys = []
+
+    def get(self, sentences):
+        return [s.metadata["text"] in self.keys for s in sentences]
+
+    def put(self, sentence):
+        self.put_keys.append(sentence.metadata["text"])
+
+    def flush(self):
+        pass
+
+
+def test_cached_pipe():
+    sentences = parse(source * 50)
+    keys = [s.metadata["text"] for s in sentences]
+    read = 0
+
+    def reading(sentences):
+        nonlocal read
+        for s in sentences:
+            read += 1
+            yield s
+
+    def annotate(sentences):
+        sentences = list(sentences)
+        for s in sentences:
+            s.metadata["annotated"] = "yes"
+        return sentences
+
+    cache = FakeCache(["Es regnet."])
+    annotated = cached_pipe(annotate, cache, 8)(reading(sentences))
+    next(annotated)
+    # hits are not buffered beyond a chunk, waiting for a batch of misses
+    assert read == 8
+    assert [next(annotated).metadata["text"] for _ in range(7)] == keys[1:8]
+    assert cache.put_keys == ["Sie schläft ein."] * 4
+    assert [s.metadata.get("annotated") for s in sentences[:4]] == ["yes", None] * 2
+    assert list(annotated) == sentences[8:]
+    assert len(cache.put_keys) == 50
+
+
+def test_cached_lang_detection(tmp_path):
+    nlp = create_pipe(stages=("lang",), cache_file=str(tmp_path / "cache.db"))
+    annotated = [serialize(s) for s in nlp(parse(source))]
+    assert all("# lang = " in s for s in annotated)
+    # cache lookups stay in the consuming thread, detection runs ahead
+    assert [serialize(s) for s in nlp(parse(source))] == annotated
@@ -1,4 +1,160 @@
-from zdl_nlp.conllu import collocs, lemma_text
+import json
+
+from zdl_nlp.colloc import (
+    _has_copula,
+    _marked_by,
+    digest_rules,
+    extract_collocs,
+    rules,
+    rules_digest,
+)
+from zdl_nlp.conllu import collocs, lemma_text, parse
+
+# dependency trees with their expected collocations, in order of emission
+trees = """\
+# genitive attribute
+# text = die Folge der Maßlosigkeit
+# expected = [["GMOD", 2, 4]]
+1	die	der	DET	_	_	2	det	_	_
+2	Folge	Folge	NOUN	_	_	0	root	_	_
+3	der	der	DET	_	Case=Gen	4	det	_	_
+4	Maßlosigkeit	Maßlosigkeit	NOUN	_	Case=Gen	2	nmod	_	_
+
+# comparison with 'wie'
+# text = Diese Bilder wirkten wie ein Sog
+# expected = [["KOM", 3, 6], ["SUBJA", 3, 2]]
+1	Diese	dieser	DET	_	_	2	det	_	_
+2	Bilder	Bild	NOUN	_	Case=Nom	3	nsubj	_	_
+3	wirkten	wirken	VERB	_	_	0	root	_	_
+4	wie	wie	CCONJ	_	_	6	case	_	_
+5	ein	ein	DET	_	_	6	det	_	_
+6	Sog	Sog	NOUN	_	_	3	obl	_	_
+
+# accusative and dative objects
+# text = Die Frau gibt dem Mann das Buch
+# expected = [["SUBJA", 3, 2], ["OBJO", 3, 5], ["OBJ", 3, 7]]
+1	Die	der	DET	_	_	2	det	_	_
+2	Frau	Frau	NOUN	_	Case=Nom	3	nsubj	_	_
+3	gibt	geben	VERB	_	_	0	root	_	_
+4	dem	der	DET	_	Case=Dat	5	det	_	_
+5	Mann	Mann	NOUN	_	Case=Dat	3	obj	_	_
+6	das	der	DET	_	Case=Acc	7	det	_	_
+7	Buch	Buch	NOUN	_	Case=Acc	3	obj	_	_
+
+# genitive object
+# text = Intel bezichtigt Kunden illegaler Handlungen
+# expected = [["ATTR", 5, 4], ["OBJ", 2, 3], ["OBJO", 2, 5]]
+1	Intel	Intel	PROPN	_	_	2	nsubj	_	_
+2	bezichtigt	bezichtigen	VERB	_	_	0	root	_	_
+3	Kunden	Kunde	NOUN	_	Case=Acc	2	obj	_	_
+4	illegaler	illegal	ADJ	_	Case=Gen	5	amod	_	_
+5	Handlungen	Handlung	NOUN	_	Case=Gen	2	obl:arg	_	_
+
+# passive subject
+# text = Der Baum wurde gefällt
+# expected = [["SUBJP", 4, 2]]
+1	Der	der	DET	_	_	2	det	_	_
+2	Baum	Baum	NOUN	_	Case=Nom	4	nsubj:pass	_	_
+3	wurde	werden	AUX	_	_	4	aux:pass	_	_
+4	gefällt	fällen	VERB	_	VerbForm=Part	0	root	_	_
+
+# subject predicative with copula
+# text = Maßlosigkeit war die Folge
+# expected = [["PREDC", 1, 4]]
+1	Maßlosigkeit	Maßlosigkeit	NOUN	_	_	4	nsubj	_	_
+2	war	sein	AUX	_	_	4	cop	_	_
+3	die	der	DET	_	_	4	det	_	_
+4	Folge	Folge	NOUN	_	_	0	root	_	_
+
+# object predicative, als + NOUN
+# text = Sie bezeichnet Berichte als Horrormeldungen
+# expected = [["PP", 2, 5, 4], ["OBJ", 2, 3], ["PRED", 5, 2]]
+1	Sie	sie	PRON	_	_	2	nsubj	_	_
+2	bezeichnet	bezeichnen	VERB	_	_	0	root	_	_
+3	Berichte	Bericht	NOUN	_	Case=Acc	2	obj	_	_
+4	als	als	ADP	_	_	5	case	_	_
+5	Horrormeldungen	Horrormeldung	NOUN	_	_	2	obl	_	_
+
+# object predicative, als + ADJ
+# text = Analysten kritisieren die Begründung als wenig stichhaltig
+# expected = [["ADV", 7, 6], ["SUBJA", 2, 1], ["OBJ", 2, 4], ["PRED", 7, 2]]
+1	Analysten	Analyst	NOUN	_	_	2	nsubj	_	_
+2	kritisieren	kritisieren	VERB	_	_	0	root	_	_
+3	die	der	DET	_	_	4	det	_	_
+4	Begründung	Begründung	NOUN	_	Case=Acc	2	obj	_	_
+5	als	als	ADP	_	_	7	mark	_	_
+6	wenig	wenig	ADV	_	_	7	advmod	_	_
+7	stichhaltig	stichhaltig	ADJ	_	_	2	advcl	_	_
+
+# comparative in place of als + NOUN
+# text = Er verkauft mehr Autos als Fahrräder
+# expected = [["PP", 2, 6, 5], ["OBJ", 2, 4]]
+1	Er	er	PRON	_	_	2	nsubj	_	_
+2	verkauft	verkaufen	VERB	_	_	0	root	_	_
+3	mehr	mehr	ADV	_	_	4	advmod	_	_
+4	Autos	Auto	NOUN	_	Case=Acc	2	obj	_	_
+5	als	als	ADP	_	_	6	case	_	_
+6	Fahrräder	Fahrrad	NOUN	_	_	2	obl	_	_
+
+# predicative of 'bleiben' with its sole subject
+# text = Das Schicksal bleibt ungeklärt
+# expected = [["SUBJA", 3, 2], ["PREDC", 4, 2]]
+1	Das	der	DET	_	_	2	det	_	_
+2	Schicksal	Schicksal	NOUN	_	_	3	nsubj	_	_
+3	bleibt	bleiben	VERB	_	_	0	root	_	_
+4	ungeklärt	ungeklärt	ADJ	_	_	3	xcomp	_	_
+
+# predicative of 'bleiben' with more than one subject
+# text = Schicksal Zukunft bleiben ungeklärt
+# expected = [["SUBJA", 3, 1], ["SUBJA", 3, 2]]
+1	Schicksal	Schicksal	NOUN	_	_	3	nsubj	_	_
+2	Zukunft	Zukunft	NOUN	_	_	3	nsubj	_	_
+3	bleiben	bleiben	VERB	_	_	0	root	_	_
+4	ungeklärt	ungeklärt	ADJ	_	_	3	xcomp	_	_
+
+# coordinated verbs, collocations ordered by group and head
+# text = Sprecher bezeichnet Berichte als Spekulation und lehnt eine Stellungnahme ab
+# expected = [["PP", 2, 5, 4], ["KON", 2, 7], ["SUBJA", 2, 1], ["OBJ", 2, 3], ["OBJ", 7, 9], ["PRED", 5, 2]]
+1	Sprecher	Sprecher	NOUN	_	_	2	nsubj	_	_
+2	bezeichnet	bezeichnen	VERB	_	_	0	root	_	_
+3	Berichte	Bericht	NOUN	_	Case=Acc	2	obj	_	_
+4	als	als	ADP	_	_	5	case	_	_
+5	Spekulation	Spekulation	NOUN	_	_	2	obl	_	_
+6	und	und	CCONJ	_	_	7	cc	_	_
+7	lehnt	ablehnen	VERB	_	_	2	conj	_	_
+8	eine	ein	DET	_	_	9	det	_	_
+9	Stellungnahme	Stellungnahme	NOUN	_	Case=Acc	7	obj	_	_
+10	ab	ab	ADP	_	_	7	compound:prt	_	_
+"""
+
+
+def test_extraction_rules():
+    for s in parse(trees):
+        expected = json.loads(s.metadata.pop("expected"))
+        assert list(collocs(extract_collocs(s))) == [
+            tuple(c) for c in expected
+        ], s.metadata["text"]
+
+
+def test_rules_digest():
+    assert digest_rules(rules) == rules_digest
+    rule = {
+        "relation": "PRED",
+        "dep": (("obl",), ("noun",)),
+        "head_lemmata": {"halten", "ansehen", "bezeichnen"},
+        "if": (_marked_by({"als"}, {"case"}),),
+    }
+    digest = digest_rules((("head", (rule,)),))
+    # sets are serialized in order, whatever their insertion order
+    reordered = rule | {"head_lemmata": {"bezeichnen", "ansehen", "halten"}}
+    assert digest_rules((("head", (reordered,)),)) == digest
+    for changed in (
+        rule | {"head_lemmata": {"halten", "ansehen"}},
+        rule | {"if": (_marked_by({"wie"}, {"case"}),)},
+        rule | {"if": (_has_copula,)},
+        rule | {"phase": 1},
+    ):
+        assert digest_rules((("head", (changed,)),)) != digest
 
 
 def test_extraction(annotate, snapshot):
@@ -0,0 +1,60 @@
+import io
+
+from pytest import raises
+
+from zdl_nlp.columnar import Archive, to_conllu, write
+from zdl_nlp.conllu import parse, read_blocks, read_docs
+
+from .test_conllu import sample, token_dicts
+
+
+def archive(tmp_path, conll):
+    path = tmp_path / "corpus.cols"
+    with path.open("wb") as f:
+        write(read_blocks(io.StringIO(conll)), f)
+    return Archive(path)
+
+
+def test_round_trip(tmp_path):
+    with archive(tmp_path, sample) as a:
+        assert (len(a), a.n_tokens, a.n_documents) == (3, 14, 2)
+        f = io.StringIO()
+        to_conllu(a, f)
+        assert f.getvalue() == sample + "\n"
+        expected = parse(sample)
+        assert [token_dicts(s) for s in a.sentences()] == [
+            token_dicts(s) for s in expected
+        ]
+        assert [s.metadata for s in a.sentences()] == [s.metadata for s in expected]
+        assert [a.document(dn) for dn in range(a.n_documents)] == [
+            [[line.strip() for line in block] for block in doc]
+            for doc in read_docs(io.StringIO(sample))
+        ]
+
+
+def test_scan(tmp_path):
+    with archive(tmp_path, sample) as a:
+        assert list(a.scan("form", 1, 2)) == ["Sie", "schläft", "ein", "tief"]
+        assert list(a.scan("upos", 2)) == ["X"]
+        assert list(a.scan("lemma")) == [t["lemma"] for s in parse(sample) for t in s]
+        assert a.dictionary("metadata.key")[:3] == ["newdoc id", "newpar", "sent_id"]
+
+
+def test_close_with_views(tmp_path):
+    a = archive(tmp_path, sample)
+    lemmata = a.scan("lemma")
+    codes = a.column("token.form")[1:3]
+    a.close()
+    assert len(codes) == 2
+    with raises(ValueError):
+        next(lemmata)
+
+
+def test_empty_archive(tmp_path):
+    with archive(tmp_path, "") as a:
+        assert (len(a), a.n_tokens, a.n_documents) == (0, 0, 0)
+        assert list(a.scan("form")) == []
+        assert list(a.sentences()) == []
+        f = io.StringIO()
+        to_conllu(a, f)
+        assert f.getvalue() == ""
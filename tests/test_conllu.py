@@ -0,0 +1,157 @@
+import io
+import pickle
+
+import conllu
+from pytest import raises
+
+from zdl_nlp.conllu import (
+    CompactToken,
+    collocs,
+    hit_set,
+    invalidate_views,
+    marked_text,
+    pack_sentences,
+    parse,
+    parse_block,
+    parse_incr,
+    read_blocks,
+    read_docs,
+    serialize,
+    text,
+    unpack_sentences,
+    write,
+)
+
+# multiword tokens, empty nodes, enhanced dependencies and comments without value
+sample = """\
+# newdoc id = urn:a
+# newpar
+# sent_id = 1
+# text = Im Haus ist's warm.
+1-2	Im	_	_	_	_	_	_	_	_
+1	In	in	ADP	APPR	_	3	case	_	_
+2	dem	der	DET	ART	Case=Dat|Definite=Def|Gender=Neut|Number=Sing	3	det	_	_
+3	Haus	Haus	NOUN	NN	Case=Dat|Gender=Neut|Number=Sing	4	obl	_	_
+4-5	ist's	_	_	_	_	_	_	_	SpaceAfter=No
+4	ist	sein	AUX	VAFIN	Mood=Ind|Number=Sing|Person=3|Tense=Pres|VerbForm=Fin	0	root	_	_
+5	's	es	PRON	PPER	Case=Nom|Gender=Neut|Number=Sing|Person=3	4	nsubj	_	_
+6	warm	warm	ADJ	ADJD	Degree=Pos	4	advmod	_	SpaceAfter=No
+7	.	.	PUNCT	$.	_	4	punct	_	_
+
+# sent_id = 2
+# collocations = [["ADV", 4, 3]]
+1	Sie	sie	PRON	PPER	_	2	nsubj	2:nsubj	_
+2	schläft	schlafen	VERB	VVFIN	_	0	root	0:root	_
+2.1	ein	ein	ADP	PTKVZ	_	_	_	2:compound:prt	CopyOf=-1
+3	tief	tief	ADV	ADV	_	2	advmod	2:advmod	SpaceAfter=No|Foo=bar=baz
+
+# newdoc id = urn:b
+# text = x
+1	x	_	X	_	_	0	root	_	_
+"""
+
+
+def token_dicts(sentence):
+    return [dict(t) for t in sentence]
+
+
+def test_parse_as_conllu():
+    expected = conllu.parse(sample)
+    for compact in (False, True):
+        parsed = parse(sample, compact)
+        assert [token_dicts(s) for s in parsed] == [token_dicts(s) for s in expected]
+        assert [s.metadata for s in parsed] == [s.metadata for s in expected]
+    incr = parse_incr(io.StringIO(sample))
+    assert [token_dicts(s) for s in incr] == [token_dicts(s) for s in expected]
+
+
+def test_read_docs():
+    docs = list(read_docs(io.StringIO(sample)))
+    assert [len(doc) for doc in docs] == [2, 1]
+    assert [block for doc in docs for block in doc] == list(
+        read_blocks(io.StringIO(sample))
+    )
+    assert list(read_docs(io.StringIO(""))) == []
+    # sentences before the first document header form one of their own
+    docs = read_docs(io.StringIO("1\ta\n\n" + sample))
+    assert [len(doc) for doc in docs] == [1, 2, 1]
+
+
+def test_parse_block_rejects_conllu_plus():
+    with raises(ValueError):
+        parse_block(["# global.columns = ID FORM", "1\tHaus"])
+
+
+def test_serialize_as_conllu():
+    expected = conllu.parse(sample)
+    # values set by annotation stages, i. e. the empty value of a misc flag
+    expected[1][0]["misc"] = {"DWDSmor": "No", "Flag": None}
+    expected[1][1]["feats"] = {"Mood": "Ind"}
+    for compact in (False, True):
+        sentences = parse(sample, compact)
+        sentences[1][0]["misc"] = {"DWDSmor": "No", "Flag": None}
+        sentences[1][1]["feats"] = {"Mood": "Ind"}
+        for s, e in zip(sentences, expected):
+            assert serialize(s) == e.serialize()
+        f = io.StringIO()
+        write(sentences, f, batch_size=2)
+        assert f.getvalue() == "".join(e.serialize() for e in expected)
+
+
+def test_compact_token_fields():
+    t = CompactToken({"id": 1, "form": "Haus", "lemma": "Haus"})
+    assert t["form"] == "Haus"
+    assert "lemma" in t and "upos" not in t
+    assert t.get("upos") is None
+    assert dict(t) == {"id": 1, "form": "Haus", "lemma": "Haus"}
+    del t["lemma"]
+    assert "lemma" not in t and len(t) == 2
+    for k in ("upos", "items", "keys", "__class__"):
+        with raises(KeyError):
+            t[k]
+        assert t.get(k, "_") == "_"
+    for k in ("items", "keys"):
+        with raises(KeyError):
+            t[k] = "x"
+        with raises(KeyError):
+            del t[k]
+
+
+def test_pack_sentences():
+    sentences = parse(sample)
+    # tokens with varying fields
+    del sentences[1][0]["misc"]
+    sentences.append(conllu.TokenList([], {"newdoc id": "urn:c"}))
+    packed = pickle.loads(pickle.dumps(pack_sentences(sentences)))
+    unpacked = unpack_sentences(packed)
+    assert [s.__class__ for s in packed] == [tuple, conllu.TokenList, tuple, tuple]
+    assert [token_dicts(s) for s in unpacked] == [token_dicts(s) for s in sentences]
+    assert [s.metadata for s in unpacked] == [s.metadata for s in sentences]
+    assert [serialize(s) for s in unpacked] == [serialize(s) for s in sentences]
+
+
+def test_memoized_views():
+    sentence = parse(sample)[1]
+    sentence.metadata["hits"] = "[2]"
+    assert text(sentence) == "Sie schläft ein tief"
+    assert text(sentence) is text(sentence)
+    assert hit_set(sentence) is hit_set(sentence) == {2}
+    assert collocs(sentence) == (("ADV", 4, 3),)
+    marked = marked_text(sentence)
+    assert marked is marked_text(sentence)
+    assert marked == "Sie <t>schläft</t> ein tief"
+
+    # views are recomputed for replaced metadata values and tokens
+    sentence.metadata["hits"] = "[1]"
+    assert hit_set(sentence) == {1}
+    assert marked_text(sentence) == "<t>Sie</t> schläft ein tief"
+    sentence[0] = type(sentence[0])(dict(sentence[0], form="Er"))
+    assert text(sentence) == "Er schläft ein tief"
+    assert marked_text(sentence) == "<t>Er</t> schläft ein tief"
+
+    # tokens changed in place require invalidation
+    sentence[0]["form"] = "Es"
+    assert text(sentence) == "Er schläft ein tief"
+    invalidate_views(sentence)
+    assert text(sentence) == "Es schläft ein tief"
+    assert marked_text(sentence) == "<t>Es</t> schläft ein tief"
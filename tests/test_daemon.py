@@ -0,0 +1,79 @@
+import io
+import socket
+import threading
+
+from pytest import fixture, raises
+
+from zdl_nlp.conllu import parse, serialize
+from zdl_nlp.daemon import AnnotationError, AnnotationServer, annotate
+
+from .test_cache import source
+
+
+def marked(sentences):
+    for s in sentences:
+        s.metadata["annotated"] = "yes"
+        yield s
+
+
+def failing(sentences):
+    for n, s in enumerate(marked(sentences)):
+        if n == 1:
+            raise ValueError("pipeline failure")
+        yield s
+
+
+@fixture
+def server(tmp_path):
+    socket_path = str(tmp_path / "annotate.sock")
+    with AnnotationServer(socket_path, marked) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server, socket_path
+        server.shutdown()
+        thread.join()
+
+
+def test_round_trip(server):
+    _server, socket_path = server
+    output = io.BytesIO()
+    annotate(socket_path, io.BytesIO(source.encode("utf-8") * 100), output, 1024)
+    annotated = output.getvalue().decode("utf-8")
+    assert annotated.count("# annotated = yes\n") == 200
+    assert annotated.startswith("# text = Sie schläft ein.\n# annotated = yes\n")
+
+    output = io.BytesIO()
+    annotate(socket_path, io.BytesIO(), output)
+    assert output.getvalue() == b""
+
+
+def test_server_error(server):
+    server, socket_path = server
+    server.pipe = failing
+    output = io.BytesIO()
+    with raises(AnnotationError, match="pipeline failure"):
+        annotate(socket_path, io.BytesIO(source.encode("utf-8")), output)
+    # sentences annotated before the failure are kept
+    assert output.getvalue().decode("utf-8").count("# annotated = yes\n") == 1
+
+
+def test_incomplete_annotations(tmp_path):
+    socket_path = str(tmp_path / "annotate.sock")
+    annotated = serialize(next(marked(parse(source)))).encode("utf-8")
+
+    # a server killed while annotating
+    def serve_partially(listener):
+        conn, _addr = listener.accept()
+        with conn:
+            conn.sendall(annotated)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(socket_path)
+        listener.listen()
+        thread = threading.Thread(target=serve_partially, args=(listener,))
+        thread.start()
+        output = io.BytesIO()
+        with raises(AnnotationError, match="Incomplete"):
+            annotate(socket_path, io.BytesIO(source.encode("utf-8")), output)
+        thread.join()
+    assert output.getvalue() == annotated
@@ -0,0 +1,480 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import batched
+from multiprocessing.pool import ThreadPool
+from types import SimpleNamespace
+
+import spacy
+from conllu.models import Metadata, Token, TokenList
+from lingua import Language
+from pytest import fixture, raises
+
+import zdl_nlp.annotate
+from zdl_nlp.annotate import (
+    LRUCache,
+    OutlierLane,
+    Pipeline,
+    Timed,
+    detect_langs_ahead,
+    documents,
+    dwdsmor_lemmatize,
+    is_lang_deviation,
+    length_sorted,
+    lingua_detect_documents,
+    parsed_doc,
+    reset_annotations,
+    routed_pipe,
+    schedule,
+    score_gdex,
+    sort_windows,
+    stale_stages,
+)
+from zdl_nlp.conllu import pack_sentences, parse, unpack_sentences
+
+
+@fixture(scope="module")
+def pool():
+    with ThreadPool(4) as pool:
+        yield pool
+
+
+def delayed(n):
+    time.sleep(random.random() / 100)
+    return -n
+
+
+def test_schedule(pool):
+    in_flight = 0
+    max_in_flight = 0
+
+    def batches():
+        nonlocal in_flight, max_in_flight
+        for n in range(64):
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            yield n
+
+    results = []
+    for result in schedule(pool, delayed, batches(), 3):
+        in_flight -= 1
+        results.append(result)
+    assert results == [-n for n in range(64)]
+    assert max_in_flight <= 3
+
+    results = schedule(pool, delayed, range(64), 3, ordered=False)
+    assert sorted(results) == [-n for n in range(63, -1, -1)]
+    assert list(schedule(pool, delayed, (), 3)) == []
+
+
+def test_outlier_lane(pool):
+    lock = threading.Lock()
+    running = max_running = 0
+
+    def annotate(packed, lane="regular"):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(random.random() / 100)
+        sentences = list(unpack_sentences(packed))
+        for s in sentences:
+            s.metadata["lane"] = lane
+        with lock:
+            running -= 1
+        return pack_sentences(sentences), {}
+
+    sentences = [
+        TokenList([Token(form="x")] * (1 + n % 5), Metadata(sent_id=str(n)))
+        for n in range(256)
+    ]
+    lane = OutlierLane(pool, lambda packed: annotate(packed, "outlier"), 1)
+
+    def regular(sentences):
+        batches = map(pack_sentences, batched(sentences, 4))
+        for batch, _ in schedule(pool, annotate, batches, 3, lane=lane):
+            yield from unpack_sentences(batch)
+
+    annotated = list(routed_pipe(regular, lane.add, 3)(sentences))
+    assert max_running <= 3
+    assert {s.metadata["lane"] for s in annotated if len(s) > 3} == {"outlier"}
+    assert {s.metadata["lane"] for s in annotated if len(s) <= 3} == {"regular"}
+    sent_ids = [s.metadata["sent_id"] for s in annotated]
+    assert sent_ids == [s.metadata["sent_id"] for s in sentences]
+
+
+def test_length_sorted():
+    calls = []
+
+    def pipe(sentences):
+        calls.append(1)
+        for s in sentences:
+            s.metadata["length"] = str(len(s))
+            yield s
+
+    sentences = [TokenList([Token(form="x")] * (n * 7 % 10)) for n in range(25)]
+    sorted_sentences = length_sorted(pipe, list(sentences), 10)
+    assert list(sorted_sentences) == sentences
+    assert calls == [1]
+    orders = deque()
+    lengths = [len(s) for s in sort_windows(sentences, 10, orders)]
+    assert lengths[:10] == sorted(lengths[:10])
+    assert len(orders) == 3
+
+
+def test_document_batches():
+    sentences = parse(
+        "".join(
+            (f"# newdoc id = {n}\n" if n % 5 in (1, 4) else "")
+            + f"1\tx{n}\t_\t_\t_\t_\t_\t_\t_\t_\n\n"
+            for n in range(20)
+        )
+    )
+    docs = [[s[0]["form"] for s in doc] for doc in documents(sentences)]
+    assert docs[:3] == [["x0"], ["x1", "x2", "x3"], ["x4", "x5"]]
+    assert sum(docs, []) == [f"x{n}" for n in range(20)]
+
+    batches = list(Pipeline(batch_size=4).batches(sentences, by_document=True))
+    assert [len(b) for b in batches] == [4, 2, 3, 2, 3, 2, 4]
+    for batch in batches:
+        assert batch[0] is sentences[0] or "newdoc id" in batch[0].metadata
+    batches = Pipeline(batch_tokens=4).batches(sentences, by_document=True)
+    assert [len(b) for b in batches] == [4, 2, 3, 2, 3, 2, 4]
+
+
+def failing(n):
+    if n == 5:
+        raise ValueError(n)
+    return n
+
+
+def test_schedule_errors(pool):
+    with raises(ValueError):
+        list(schedule(pool, failing, range(10), 2))
+
+
+versions = {
+    "spacy": "de_zdl_lg-1.0",
+    "gdex": "1.7.0",
+    "dwdsmor": "2.0",
+    "lingua": "1.3",
+    "colloc": "zdl_nlp-1.0+abc",
+    "phrasal_verbs": "zdl_nlp-1.0",
+}
+
+
+def stamped(stamps):
+    stamps = stamps if isinstance(stamps, str) else json.dumps(stamps)
+    return TokenList([], Metadata({"stages": stamps}))
+
+
+def test_stale_stages():
+    assert stale_stages(stamped(versions), versions) == set()
+    assert stale_stages(TokenList([]), versions) == set(versions)
+    assert stale_stages(stamped("{"), versions) == set(versions)
+    assert stale_stages(stamped("[]"), versions) == set(versions)
+    assert stale_stages(stamped(versions | {"dwdsmor": "1.0"}), versions) == {
+        "dwdsmor",
+        "colloc",
+        "phrasal_verbs",
+    }
+    assert stale_stages(stamped(versions | {"spacy": "de_zdl_lg-0.9"}), versions) == (
+        set(versions) - {"lingua"}
+    )
+    stamps = {k: v for k, v in versions.items() if k != "lingua"}
+    assert stale_stages(stamped(stamps), versions) == {"lingua"}
+
+
+def test_reset_annotations():
+    metadata = {
+        "text": "Sie schläft ein",
+        "entities": "[]",
+        "gdex": "0.5",
+        "lang": "de",
+        "collocations": "[]",
+    }
+    misc = {"SpaceAfter": "No", "DWDSmor": "No", "CompoundPrt": 3}
+    sentence = TokenList([Token(form="Sie", misc=dict(misc))], Metadata(metadata))
+    reset_annotations(sentence, {"dwdsmor", "colloc", "phrasal_verbs"})
+    assert sentence.metadata == {
+        k: v for k, v in metadata.items() if k != "collocations"
+    }
+    assert sentence[0]["misc"] == {"SpaceAfter": "No"}
+    reset_annotations(sentence, {"spacy", "gdex", "lingua"})
+    assert sentence.metadata == {"text": "Sie schläft ein"}
+
+
+def test_stage_requirements():
+    with raises(ValueError, match="requires stage 'parse'"):
+        Pipeline(stages=("lemma", "colloc"))
+    with raises(ValueError, match="requires stage 'parse'"):
+        Pipeline(outlier_stages=("lemma", "colloc"))
+    with raises(ValueError, match="not selected"):
+        Pipeline(stages=("parse",), outlier_stages=("parse", "lemma"))
+    Pipeline(outlier_stages=("parse", "lemma", "colloc"))
+
+
+parsed = """\
+# text = Anna schläft in Berlin.
+# entities = [["PER", 1], ["LOC", 4]]
+1	Anna	Anna	PROPN	NE	Case=Nom|Number=Sing	2	nsubj	_	_
+2	schläft	schlafen	VERB	VVFIN	Number=Sing|Person=3	0	root	_	_
+3	in	in	ADP	APPR	_	4	case	_	_
+4	Berlin	Berlin	PROPN	NE	Case=Dat|Number=Sing	2	obl	_	SpaceAfter=No
+5	.	.	PUNCT	$.	_	2	punct	_	_
+
+"""
+
+
+def test_parsed_doc():
+    (sentence,) = parse(parsed)
+    doc = parsed_doc(spacy.blank("de").vocab, sentence)
+    assert doc.text == "Anna schläft in Berlin. "
+    assert [t.lemma_ for t in doc] == [t["lemma"] for t in sentence]
+    assert [t.pos_ for t in doc] == [t["upos"] for t in sentence]
+    assert [t.tag_ for t in doc] == [t["xpos"] for t in sentence]
+    assert str(doc[1].morph) == "Number=Sing|Person=3"
+    assert [t.head.i for t in doc] == [1, 1, 3, 1, 1]
+    assert [t.dep_ for t in doc] == ["nsubj", "ROOT", "case", "obl", "punct"]
+    assert [(e.label_, e.text) for e in doc.ents] == [
+        ("PER", "Anna"),
+        ("LOC", "Berlin"),
+    ]
+    assert len(list(doc.sents)) == 1
+
+
+class FakeGdex:
+    def __init__(self):
+        self.scored = []
+
+    def de_hdt(self, doc):
+        self.scored.append(doc)
+        sent = SimpleNamespace(_=SimpleNamespace(gdex=len(doc) / 10))
+        return SimpleNamespace(sents=iter([sent]))
+
+
+def test_score_gdex(monkeypatch):
+    fake_gdex = FakeGdex()
+    monkeypatch.setattr(zdl_nlp.annotate, "gdex", fake_gdex)
+    nlp = spacy.blank("de")
+
+    def sentences():
+        long, short = parse(parsed * 2)
+        return [long, TokenList(list(short)[:4], short.metadata)]
+
+    # documents kept by the spaCy stage are taken, others are restored
+    scored = sentences()
+    kept = scored[0].spacy_doc = parsed_doc(nlp.vocab, scored[0])
+    assert list(score_gdex(nlp, scored)) == scored
+    assert fake_gdex.scored[0] is kept
+    assert [len(doc) for doc in fake_gdex.scored] == [5, 4]
+    assert [s.metadata["gdex"] for s in scored] == ["0.5", "0.4"]
+    assert "spacy_doc" not in vars(scored[0])
+
+    # sentences over the max. length are not scored
+    fake_gdex.scored.clear()
+    scored = sentences()
+    scored[0].spacy_doc = parsed_doc(nlp.vocab, scored[0])
+    list(score_gdex(nlp, scored, max_length=4))
+    assert [len(doc) for doc in fake_gdex.scored] == [4]
+    assert "gdex" not in scored[0].metadata
+    assert scored[1].metadata["gdex"] == "0.4"
+    assert "spacy_doc" not in vars(scored[0])
+
+
+def test_detect_langs_ahead():
+    detected = []
+    read = 0
+
+    def detect(sentences):
+        sentences = list(sentences)
+        detected.append((threading.current_thread(), len(sentences)))
+        for s in sentences:
+            s.metadata["lang"] = "de" if int(s.metadata["sent_id"]) % 3 else "en"
+            yield s
+
+    def reading(sentences):
+        nonlocal read
+        for s in sentences:
+            read += 1
+            yield s
+
+    sentences = [TokenList([], Metadata(sent_id=str(n))) for n in range(100)]
+    ahead, set_langs = detect_langs_ahead(detect, reading(sentences), 8)
+    annotated = set_langs(ahead)
+    for n, s in enumerate(annotated):
+        assert s is sentences[n]
+        assert s.metadata["lang"] == ("de" if n % 3 else "en")
+        # sentences are read in batches, by the consuming thread only
+        assert read <= (n // 8 + 1) * 8
+    assert read == 100
+    assert [size for _thread, size in detected] == [8] * 12 + [4]
+    assert threading.current_thread() not in {thread for thread, _size in detected}
+
+    # languages are detected on copies, set in order of the returned stage
+    sentences = [TokenList([], Metadata(sent_id=str(n))) for n in range(10)]
+    ahead, set_langs = detect_langs_ahead(detect, iter(sentences), 4)
+    ahead = list(ahead)
+    assert all("lang" not in s.metadata for s in ahead)
+    assert [s.metadata["lang"] for s in set_langs(ahead)][:4] == [
+        "en",
+        "de",
+        "de",
+        "en",
+    ]
+
+    # batches of whole documents
+    detected.clear()
+    sentences = [TokenList([], Metadata(sent_id=str(n))) for n in range(20)]
+    for s in sentences[::5]:
+        s.metadata["newdoc id"] = s.metadata["sent_id"]
+    ahead, set_langs = detect_langs_ahead(detect, iter(sentences), 8, True)
+    assert list(set_langs(ahead)) == sentences
+    assert [size for _thread, size in detected] == [10, 10]
+
+    # a given executor is shared by calls, without being shut down
+    detected.clear()
+    with ThreadPoolExecutor(1) as executor:
+        for _ in range(3):
+            ahead, set_langs = detect_langs_ahead(
+                detect, iter(sentences), 8, executor=executor
+            )
+            assert list(set_langs(ahead)) == sentences
+        assert len({thread for thread, _size in detected}) == 1
+        assert executor.submit(len, sentences).result() == 20
+
+
+class FakeDetector:
+    """Detects English, if "the" outnumbers some German function words."""
+
+    def __init__(self):
+        self.calls = []
+
+    def detect(self, text):
+        words = text.lower().split()
+        german = sum(words.count(w) for w in ("der", "die", "dem", "im", "er"))
+        return Language.ENGLISH if words.count("the") > german else Language.GERMAN
+
+    def detect_languages_in_parallel_of(self, texts):
+        self.calls.append(texts)
+        return [self.detect(t) for t in texts]
+
+
+def sentence(text, doc_id=None):
+    metadata = Metadata({"newdoc id": doc_id} if doc_id else {})
+    return TokenList([Token(form=form, misc=None) for form in text.split()], metadata)
+
+
+def test_is_lang_deviation():
+    assert not is_lang_deviation(sentence("Der Hund und die Katze"), "de")
+    assert is_lang_deviation(sentence("The dog and the cat"), "de")
+    assert not is_lang_deviation(sentence("The dog and the cat"), "en")
+    # ties and sentences without stopwords are no deviation
+    assert not is_lang_deviation(sentence("die the"), "de")
+    assert not is_lang_deviation(sentence("Hund Katze"), "de")
+
+
+def test_lingua_detect_documents():
+    detector = FakeDetector()
+    sentences = [
+        sentence("Der Hund schläft auf dem Sofa", "mixed"),
+        sentence("Die Katze ist im Garten"),
+        sentence("The dog and the cat are friends"),
+        sentence("Er wartet"),
+        sentence("The end of the story", "single"),
+    ]
+    annotated = list(lingua_detect_documents(detector, sentences))
+    assert annotated == sentences
+    assert [s.metadata["lang"] for s in sentences] == ["de", "de", "en", "de", "en"]
+    # one sample per document, then only the deviating sentence
+    samples, rechecks = detector.calls
+    assert len(samples) == 2
+    assert rechecks == ("The dog and the cat are friends ",)
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    computed = []
+
+    def compute(key):
+        computed.append(key)
+        return key.upper()
+
+    for key in "aba":
+        assert cache.get(key, lambda k=key: compute(k)) == key.upper()
+    assert computed == ["a", "b"]
+    # "b" is least recently used after the hit on "a"
+    assert cache.get("c", lambda: compute("c")) == "C"
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.get("b", lambda: compute("b")) == "B"
+    assert list(cache.entries) == ["c", "b"]
+    assert len(cache.entries) == cache.maxsize
+    assert computed == ["a", "b", "c", "b"]
+    assert cache.take_stats() == {"hits": 1, "misses": 4, "evictions": 2}
+    assert cache.take_stats() == {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def test_cached_lemmatization():
+    lemmata = {"Hunde": ("Hund", "NN"), "bellen": ("bellen", "V")}
+    lookups = []
+
+    def lemmatizer(form, **criteria):
+        lookups.append(form)
+        if form in lemmata:
+            analysis, pos = lemmata[form]
+            return SimpleNamespace(analysis=analysis, pos=pos)
+
+    def tagged(forms):
+        pos = {"Hunde": "NN", "bellen": "VVFIN", "laut": "ADJD"}
+        return TokenList(
+            [
+                Token(form=f, lemma=None, xpos=pos[f], feats=None, misc=None)
+                for f in forms
+            ]
+        )
+
+    cache = LRUCache(16)
+    sentences = [tagged(("Hunde", "bellen", "laut")) for _ in range(3)]
+    uncached = [tagged(("Hunde", "bellen", "laut")) for _ in range(3)]
+    assert list(dwdsmor_lemmatize(lemmatizer, sentences, cache)) == sentences
+    assert lookups == ["Hunde", "bellen", "laut"]
+    assert cache.take_stats() == {"hits": 6, "misses": 3, "evictions": 0}
+    # cached results annotate like uncached lookups
+    list(dwdsmor_lemmatize(lemmatizer, uncached))
+    assert len(lookups) == 12
+    assert sentences == uncached
+    assert [t["lemma"] for t in sentences[-1]] == ["Hund", "bellen", "laut"]
+    assert sentences[-1][2]["misc"] == {"DWDSmor": "No"}
+
+
+def test_nested_timings(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(zdl_nlp.annotate, "perf_counter", lambda: clock[0])
+
+    def stage(sentences, cost):
+        for s in sentences:
+            clock[0] += cost
+            yield s
+
+    stats = Counter()
+    sentences = [sentence("Der Hund"), sentence("Die Katze schläft")]
+    timed = Timed(stats, "input", stage(sentences, 1.0))
+    timed = Timed(stats, "spacy", stage(timed, 2.0), timed)
+    timed = Timed(stats, "lingua", stage(timed, 4.0), timed)
+    assert list(timed) == sentences
+    # each stage only accounts for its own time, excluding upstream stages
+    assert stats == {
+        "stage.input.time": 2.0,
+        "stage.spacy.time": 4.0,
+        "stage.lingua.time": 8.0,
+        "stage.input.sentences": 2,
+        "stage.spacy.sentences": 2,
+        "stage.lingua.sentences": 2,
+        "stage.input.tokens": 5,
+        "stage.spacy.tokens": 5,
+        "stage.lingua.tokens": 5,
+    }
+    assert sum(v for k, v in stats.items() if k.endswith(".time")) == clock[0]
@@ -0,0 +1,93 @@
+import backoff._sync
+import requests
+from lxml import etree as ET
+from pytest import fixture, raises
+
+from zdl_nlp.conllu import read_docs
+from zdl_nlp.solr import index_update, update_docs, xml_add, xml_delete
+
+
+def test_xml_escaping():
+    docs = [
+        (("id", "a&b#1"), ("text", "<t> & </t>\r\n\"'"), ("gdex_f", 0.5)),
+        (("id", "ä#2"), ("gdex_b", True)),
+    ]
+    chunks = list(xml_add(docs, chunk_size=1))
+    assert len(chunks) == 3
+    add = ET.fromstring(b"".join(chunks))
+    assert [
+        [(f.get("name"), f.text) for f in doc.iterfind("field")]
+        for doc in add.iterfind("doc")
+    ] == [
+        [("id", "a&b#1"), ("text", "<t> & </t>\r\n\"'"), ("gdex_f", "0.5")],
+        [("id", "ä#2"), ("gdex_b", "True")],
+    ]
+    assert ET.fromstring(b"".join(xml_delete("id:a&b")))[0].text == "id:a&b"
+
+
+def test_update_docs():
+    conll = (
+        "# newdoc id = urn:a&b\n"
+        "# gdex = 0.6\n"
+        "1\tA&B\tA&B\tPROPN\tNE\t_\t0\troot\t_\tSpaceAfter=No\n"
+        "2\t<\t<\tPUNCT\t$(\t_\t1\tpunct\t_\t_\n"
+        "\n"
+    )
+    (fields,) = update_docs(read_docs(conll.splitlines(True)))
+    fields = dict(fields)
+    assert fields["id"] == "urn:a&b#1"
+    assert fields["gdex_b"] is True
+    assert fields["text_pre"].startswith("1 =A&B<= A&B,i=1,s=0,e=3")
+    add = ET.fromstring(b"".join(xml_add([tuple(fields.items())])))
+    assert add.find("doc/field[@name='text_pre']").text == fields["text_pre"]
+
+
+class FakeSession:
+    """Answers posted updates with scripted responses or connection errors."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.updates = []
+
+    def post(self, url, headers, params, data):
+        self.updates.append(b"".join(data))
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        r = requests.Response()
+        r.status_code = answer
+        r.url = url
+        r._content = b'{"responseHeader": {"status": 0}}'
+        return r
+
+
+@fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(backoff._sync.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def update():
+    return xml_delete("*:*")
+
+
+def test_update_retries(sleeps):
+    http = FakeSession(503, requests.ConnectionError(), 200)
+    result = index_update("http://solr", "core", update, http, max_tries=3)
+    assert result == {"responseHeader": {"status": 0}}
+    assert len(sleeps) == 2
+    # each try posts the whole update, generated anew
+    assert http.updates == [b"".join(update())] * 3
+
+
+def test_update_failures(sleeps):
+    http = FakeSession(400, 200)
+    with raises(requests.HTTPError, match="400"):
+        index_update("http://solr", "core", update, http, max_tries=3)
+    assert len(http.updates) == 1 and not sleeps
+
+    http = FakeSession(503, 503, 503, 200)
+    with raises(requests.HTTPError, match="503"):
+        index_update("http://solr", "core", update, http, max_tries=3)
+    assert len(http.updates) == 3 and len(sleeps) == 2
@@ -0,0 +1,11 @@
+from zdl_nlp.utils import size_batched
+
+
+def test_size_batched():
+    sizes = (3, 4, 2, 9, 1, 1, 1, 1, 12, 5)
+    batches = list(size_batched(sizes, 8, lambda n: n))
+    assert batches == [(3, 4), (2,), (9,), (1, 1, 1, 1), (12,), (5,)]
+    batches = list(size_batched(sizes, 8, lambda n: n, max_n=2))
+    assert batches == [(3, 4), (2,), (9,), (1, 1), (1, 1), (12,), (5,)]
+    assert list(size_batched((), 8)) == []
+    assert list(size_batched(("ab", "cd", "efg"), 4)) == [("ab", "cd"), ("efg",)]
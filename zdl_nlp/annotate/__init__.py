@@ -1,9 +1,15 @@
 import atexit
+import gc
+import importlib.metadata
 import json
 import multiprocessing
 import os
-from dataclasses import dataclass
+import queue
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
 from itertools import batched, tee
+from time import perf_counter
 
 import conllu
 import conllu.parser
@@ -13,13 +19,80 @@ import gdex
 import spacy
 import spacy.tokens
 import thinc.api
+from conllu.models import Metadata, TokenList
 from lingua import Language, LanguageDetectorBuilder
 
 from ..colloc import extract_collocs
-from ..conllu import is_space_after, text
+from ..colloc import rules_digest as colloc_rules_digest
+from ..conllu import is_space_after, pack_sentences, text, unpack_sentences
+from ..log import logger
+from ..utils import size_batched
+from ..version import __version__
+from .cache import AnnotationCache
 
 
-def spacy_pipe(nlp, sentences, batch_size=128, **kwargs):
+def sort_windows(sentences, window_size, orders):
+    """Sorts windows of sentences by length, recording their orders."""
+    for window in batched(sentences, window_size):
+        order = sorted(range(len(window)), key=lambda i: len(window[i]))
+        orders.append(order)
+        yield from (window[i] for i in order)
+
+
+def restore_order(sentences, orders):
+    """Restores the input order of windows of sentences, sorted by length."""
+    sentences = iter(sentences)
+    for s in sentences:
+        order = orders.popleft()
+        window = [None] * len(order)
+        window[order[0]] = s
+        for i in order[1:]:
+            window[i] = next(sentences)
+        yield from window
+
+
+def length_sorted(pipe, sentences, window_size):
+    """Passes windows of sentences sorted by length, restoring input order.
+
+    Batches of sentences with similar length need less padding. All windows
+    are passed in a single call, so the pipe is not drained in between.
+    """
+    orders = deque()
+    return restore_order(pipe(sort_windows(sentences, window_size, orders)), orders)
+
+
+def spacy_pipe(
+    nlp,
+    sentences,
+    batch_size=128,
+    sort_window=0,
+    batch_tokens=0,
+    keep_docs=False,
+    **kwargs,
+):
+    """Tags and parses sentences, optionally keeping their spaCy documents.
+
+    Kept documents are attached to sentences until a later stage (scoring
+    via GDEX) takes them.
+    """
+    if sort_window > 0:
+        yield from length_sorted(
+            lambda sents: spacy_pipe(
+                nlp,
+                sents,
+                batch_size,
+                batch_tokens=batch_tokens,
+                keep_docs=keep_docs,
+                **kwargs,
+            ),
+            sentences,
+            sort_window,
+        )
+        return
+    if batch_tokens > 0:
+        for batch in size_batched(sentences, batch_tokens, len, batch_size):
+            yield from spacy_pipe(nlp, batch, len(batch), keep_docs=keep_docs, **kwargs)
+        return
     doc_sents, sentences = tee(sentences, 2)
     docs = (
         spacy.tokens.Doc(
@@ -32,23 +105,25 @@ def spacy_pipe(nlp, sentences, batch_size=128, **kwargs):
     )
     docs = nlp.pipe(docs, batch_size=batch_size, **kwargs)
     for s, doc in zip(sentences, docs):
+        is_parsed = doc.has_annotation("DEP")
         for token, nlp_token in zip(s, doc):
             feats = (
                 conllu.parser.parse_dict_value(str(nlp_token.morph))
                 if nlp_token.morph
                 else None
             )
-            is_root = nlp_token.dep_ == "ROOT"
             token.update(
                 {
                     "lemma": nlp_token.lemma_,
                     "upos": nlp_token.pos_,
                     "xpos": nlp_token.tag_,
                     "feats": feats,
-                    "head": 0 if is_root else nlp_token.head.i + 1,
-                    "deprel": "root" if is_root else nlp_token.dep_,
                 }
             )
+            if is_parsed:
+                is_root = nlp_token.dep_ == "ROOT"
+                token["head"] = 0 if is_root else nlp_token.head.i + 1
+                token["deprel"] = "root" if is_root else nlp_token.dep_
         if doc.ents:
             s.metadata["entities"] = json.dumps(
                 tuple(
@@ -56,13 +131,57 @@ def spacy_pipe(nlp, sentences, batch_size=128, **kwargs):
                     for e in doc.ents
                 )
             )
-        if len(doc) > 0:
+        if keep_docs:
+            s.spacy_doc = doc
+        yield s
+
+
+def parsed_doc(vocab, sentence):
+    """Restores a parsed spaCy document from the annotations of a sentence."""
+    ents = ["O"] * len(sentence)
+    for label, start, *inside in json.loads(sentence.metadata.get("entities", "[]")):
+        ents[start - 1] = f"B-{label}"
+        for ti in inside:
+            ents[ti - 1] = f"I-{label}"
+    return spacy.tokens.Doc(
+        vocab,
+        words=[t["form"] for t in sentence],
+        spaces=[is_space_after(t) for t in sentence],
+        lemmas=[t["lemma"] for t in sentence],
+        pos=[t["upos"] for t in sentence],
+        tags=[t["xpos"] for t in sentence],
+        morphs=[
+            "|".join(f"{k}={v}" for k, v in (t["feats"] or {}).items())
+            for t in sentence
+        ],
+        heads=[t["head"] - 1 if t["head"] else ti for ti, t in enumerate(sentence)],
+        deps=["ROOT" if t["deprel"] == "root" else t["deprel"] for t in sentence],
+        ents=ents,
+    )
+
+
+def score_gdex(nlp, sentences, max_length=0):
+    """Scores sentences as dictionary examples, using the documents kept by spaCy.
+
+    Documents of sentences, which have not been parsed in the same run (i. e.
+    when re-annotating), are restored from their annotations. Sentences longer
+    than `max_length` tokens (if > 0) are not scored.
+    """
+    for s in sentences:
+        doc = vars(s).pop("spacy_doc", None)
+        if 0 < len(s) and (max_length <= 0 or len(s) <= max_length):
+            if doc is None:
+                doc = parsed_doc(nlp.vocab, s)
             doc = gdex.de_hdt(doc)
             doc_sent, *_ = doc.sents
             s.metadata["gdex"] = str(doc_sent._.gdex)
         yield s
 
 
+def lang_code(lang):
+    return lang.iso_code_639_1.name.lower() if lang and lang.iso_code_639_1 else None
+
+
 def lingua_detect(lang_detector, sentences, batch_size=4096):
     sentences, sents = tee(sentences, 2)
     texts = (text(s) for s in sentences)
@@ -73,11 +192,168 @@ def lingua_detect(lang_detector, sentences, batch_size=4096):
         for lang in lang_detector.detect_languages_in_parallel_of(tuple(tb))
     )
     for sentence, lang in zip(sents, langs):
-        if lang and lang.iso_code_639_1:
-            sentence.metadata["lang"] = lang.iso_code_639_1.name.lower()
+        if lang := lang_code(lang):
+            sentence.metadata["lang"] = lang
         yield sentence
 
 
+_stopwords = {
+    "de": frozenset(
+        (
+            "auch auf aus bei das dass dem den der des die ein eine einen "
+            "er es für ich im ist mit nicht noch sich sie sind und von "
+            "war wie wir zu zum zur"
+        ).split()
+    ),
+    "en": frozenset(
+        (
+            "a and are as be by for from had has have he his is it of "
+            "on or that the their this to was were which with you"
+        ).split()
+    ),
+    "fr": frozenset(
+        (
+            "au aux avec ce ces dans de des du elle est et il je la le "
+            "les leur mais ne nous par pas pour qui sont sur une vous"
+        ).split()
+    ),
+    "la": frozenset(
+        (
+            "ab ad atque autem cum enim eius erat esse est et etiam ex "
+            "hoc in nec non per quae quam qui quod sed sunt ut"
+        ).split()
+    ),
+}
+
+
+def is_lang_deviation(sentence, lang):
+    """Stopwords of another language outnumber those of the given one."""
+    counts = Counter(
+        sw_lang
+        for t in sentence
+        for sw_lang, stopwords in _stopwords.items()
+        if t["form"].lower() in stopwords
+    )
+    lang_count = counts.pop(lang, 0)
+    return any(c > lang_count for c in counts.values())
+
+
+def documents(sentences):
+    """Groups sentences into documents, each starting with a `newdoc id`.
+
+    Sentences preceding the first document are yielded on their own.
+    """
+    doc = []
+    for s in sentences:
+        if "newdoc id" in s.metadata:
+            if doc:
+                yield doc
+            doc = [s]
+        elif doc:
+            doc.append(s)
+        else:
+            yield [s]
+    if doc:
+        yield doc
+
+
+def batched_documents(docs, batch_size):
+    batch = []
+    batch_len = 0
+    for doc in docs:
+        batch.append(doc)
+        batch_len += len(doc)
+        if batch_len >= batch_size:
+            yield batch
+            batch = []
+            batch_len = 0
+    if batch:
+        yield batch
+
+
+def lingua_detect_documents(lang_detector, sentences, batch_size=4096, sample_size=16):
+    """Detects languages per document, propagating results to its sentences.
+
+    Languages are detected on a sample of up to `sample_size` sentences per
+    document. Only sentences whose stopwords hint at a different language
+    are checked individually.
+
+    Documents are delimited by sentences with a `newdoc id`: if such a sentence
+    is taken from the annotation cache or routed to the outlier lane, the
+    following sentences are grouped with the preceding document.
+    """
+    for docs in batched_documents(documents(sentences), batch_size):
+        samples = tuple(
+            "".join(
+                text(s) for s in doc[:: max(1, len(doc) // sample_size)][:sample_size]
+            )
+            for doc in docs
+        )
+        doc_langs = lang_detector.detect_languages_in_parallel_of(samples)
+        rechecks = []
+        for doc, doc_lang in zip(docs, doc_langs):
+            doc_lang = lang_code(doc_lang)
+            for s in doc:
+                if doc_lang and not is_lang_deviation(s, doc_lang):
+                    s.metadata["lang"] = doc_lang
+                else:
+                    rechecks.append(s)
+        if rechecks:
+            langs = lang_detector.detect_languages_in_parallel_of(
+                tuple(text(s) for s in rechecks)
+            )
+            for s, lang in zip(rechecks, langs):
+                if lang := lang_code(lang):
+                    s.metadata["lang"] = lang
+        for doc in docs:
+            yield from doc
+
+
+def detect_langs_ahead(detect, sentences, batch_size, by_document=False, executor=None):
+    """Runs language detection in a background thread, ahead of other stages.
+
+    Sentences are pulled in batches (of whole documents, if `by_document`) by
+    the consuming thread, so that upstream stages never run in the background.
+    Languages are detected on copies of each batch and set by the returned
+    stage, which has to receive the sentences in input order.
+
+    Detection runs on the given executor or, by default, a thread of its own.
+    """
+    detected = deque()
+    langs = deque()
+
+    def detect_batch(proxies):
+        return [proxy.metadata.get("lang") for proxy in detect(proxies)]
+
+    def ahead():
+        if by_document:
+            batches = (
+                [s for doc in docs for s in doc]
+                for docs in batched_documents(documents(sentences), batch_size)
+            )
+        else:
+            batches = batched(sentences, batch_size)
+        detector = executor or ThreadPoolExecutor(1)
+        try:
+            for batch in batches:
+                proxies = [TokenList(s, Metadata(s.metadata)) for s in batch]
+                detected.append(detector.submit(detect_batch, proxies))
+                yield from batch
+        finally:
+            if executor is None:
+                detector.shutdown(wait=False)
+
+    def set_langs(sentences):
+        for s in sentences:
+            if not langs:
+                langs.extend(detected.popleft().result())
+            if lang := langs.popleft():
+                s.metadata["lang"] = lang
+            yield s
+
+    return ahead(), set_langs
+
+
 def collapse_phrasal_verbs(sentence):
     for token_index, token in enumerate(sentence):
         particle = token["form"].lower()
@@ -100,34 +376,79 @@ def collapse_phrasal_verbs(sentence):
     return sentence
 
 
-def dwdsmor_lemmatize(lemmatizer, sentences):
+class LRUCache:
+    """Bounded mapping, evicting least recently used entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, compute):
+        try:
+            value = self.entries[key]
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+        except KeyError:
+            self.misses += 1
+        value = self.entries[key] = compute()
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def take_stats(self):
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+        self.hits = self.misses = self.evictions = 0
+        return stats
+
+
+def dwdsmor_lookup(lemmatizer, form, pos, *feats):
+    token_criteria = {
+        k: frozenset(v) if v else None
+        for k, v in dwdsmor.tag.hdt.criteria(pos, *feats).items()
+    }
+    return lemmatizer(form, **token_criteria)
+
+
+def dwdsmor_lemmatize(lemmatizer, sentences, cache=None):
     for sentence in sentences:
-        sep_idxs = {t["head"] for t in sentence if t["deprel"] == "compound:prt"}
+        sep_idxs = {t["head"] for t in sentence if t.get("deprel") == "compound:prt"}
         for ti, token in enumerate(sentence, 1):
             token_form = token["form"]
             token_lemma = token.get("lemma")
             token_pos = token["xpos"]
             token_morph = token["feats"] or {}
             is_sep = ti in sep_idxs
-            is_prt = token["deprel"] == "compound:prt"
-            token_criteria = {
-                k: frozenset(v) if v else None
-                for k, v in dwdsmor.tag.hdt.criteria(
-                    token_pos,
-                    token_morph.get("Number"),
-                    token_morph.get("Gender"),
-                    token_morph.get("Case"),
-                    token_morph.get("Person") or ("UnmPers" if is_sep else None),
-                    token_morph.get("Tense"),
-                    token_morph.get("Degree"),
-                    token_morph.get("Mood"),
-                    token_morph.get("VerbForm"),
-                    "SEP" if (is_prt or is_sep) else None,
-                ).items()
-            }
+            is_prt = token.get("deprel") == "compound:prt"
+            lookup_key = (
+                token_form,
+                token_pos,
+                token_morph.get("Number"),
+                token_morph.get("Gender"),
+                token_morph.get("Case"),
+                token_morph.get("Person") or ("UnmPers" if is_sep else None),
+                token_morph.get("Tense"),
+                token_morph.get("Degree"),
+                token_morph.get("Mood"),
+                token_morph.get("VerbForm"),
+                "SEP" if (is_prt or is_sep) else None,
+            )
             if not token_lemma:
                 token_lemma = token["lemma"] = token_form
-            dwdsmor_result = lemmatizer(token_form, **token_criteria)
+            if cache is None:
+                dwdsmor_result = dwdsmor_lookup(lemmatizer, *lookup_key)
+            else:
+                dwdsmor_result = cache.get(
+                    lookup_key, lambda k=lookup_key: dwdsmor_lookup(lemmatizer, *k)
+                )
             if not dwdsmor_result:
                 token["misc"] = (token["misc"] or {}) | {"DWDSmor": "No"}
                 continue
@@ -142,13 +463,224 @@ def dwdsmor_lemmatize(lemmatizer, sentences):
         yield sentence
 
 
+class Timed:
+    """Iterates over the output of a stage, accounting time spent in it.
+
+    Time spent in the upstream stage, if timed itself, is excluded.
+    """
+
+    def __init__(self, stats, stage, sentences, upstream=None):
+        self.stats = stats
+        self.stage = stage
+        self.sentences = iter(sentences)
+        self.upstream = upstream
+        self.total_time = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        upstream_time = self.upstream.total_time if self.upstream else 0.0
+        start = perf_counter()
+        try:
+            s = next(self.sentences)
+        finally:
+            elapsed = perf_counter() - start
+            self.total_time += elapsed
+            if self.upstream:
+                elapsed -= self.upstream.total_time - upstream_time
+            self.stats[f"stage.{self.stage}.time"] += elapsed
+        self.stats[f"stage.{self.stage}.sentences"] += 1
+        self.stats[f"stage.{self.stage}.tokens"] += len(s)
+        return s
+
+
+stages = ("input", "spacy", "gdex", "dwdsmor", "lingua", "colloc", "phrasal_verbs")
+
+# stages to be selected for a pipeline, in addition to tagging via spaCy
+selectable_stages = ("parse", "ner", "gdex", "lemma", "lang", "colloc", "phrasal_verbs")
+
+# selectable stages, which are named differently in the pipeline
+stage_selections = {"dwdsmor": "lemma", "lingua": "lang"}
+
+# spaCy components to be excluded, if a stage is not selected
+spacy_components = {"parse": ("parser",), "ner": ("ner",)}
+
+stage_requirements = {
+    "gdex": ("parse",),
+    "colloc": ("parse",),
+    "phrasal_verbs": ("parse",),
+}
+
+# stages relying on annotations of a given one
+stage_dependants = {
+    "spacy": ("gdex", "dwdsmor", "colloc", "phrasal_verbs"),
+    "dwdsmor": ("colloc", "phrasal_verbs"),
+    "colloc": ("phrasal_verbs",),
+}
+
+
+def stage_timings(stats):
+    """Per-stage statistics, with time exclusive of upstream stages."""
+    timings = {}
+    for stage in stages:
+        time = stats[f"stage.{stage}.time"]
+        if not time:
+            continue
+        timings[stage] = {
+            "time": time,
+            "sentences": stats[f"stage.{stage}.sentences"],
+            "tokens": stats[f"stage.{stage}.tokens"],
+        }
+    return timings
+
+
+def dist_version(*dists):
+    for dist in dists:
+        try:
+            return importlib.metadata.version(dist)
+        except importlib.metadata.PackageNotFoundError:
+            pass
+    return "unknown"
+
+
+def stale_stages(sentence, versions):
+    """Stages whose annotations are missing or stem from another version."""
+    try:
+        stamps = json.loads(sentence.metadata.get("stages") or "{}")
+    except ValueError:
+        stamps = {}
+    if not isinstance(stamps, dict):
+        stamps = {}
+    stale = {stage for stage, v in versions.items() if stamps.get(stage) != v}
+    for stage in tuple(stale):
+        stale.update(stage_dependants.get(stage, ()))
+    return stale
+
+
+def reset_annotations(sentence, stages):
+    """Removes annotations of stages, which are not simply overwritten."""
+    metadata = sentence.metadata
+    if "spacy" in stages:
+        metadata.pop("entities", None)
+    if "gdex" in stages:
+        metadata.pop("gdex", None)
+    if "lingua" in stages:
+        metadata.pop("lang", None)
+    if "colloc" in stages:
+        metadata.pop("collocations", None)
+    misc_keys = set()
+    if "dwdsmor" in stages:
+        misc_keys.add("DWDSmor")
+    if "phrasal_verbs" in stages:
+        misc_keys.update(("CompoundPrt", "CompoundVerb"))
+    if misc_keys:
+        for t in sentence:
+            if misc := t.get("misc"):
+                for k in misc_keys:
+                    misc.pop(k, None)
+    return sentence
+
+
 @dataclass
 class Pipeline:
     gpus: tuple[int, ...] = tuple()
     batch_size: int = 128
+    batch_tokens: int = 0
     n_procs: int = -1
+    lemma_cache_size: int = 65536
+    doc_lang: bool = False
+    timings: bool = False
+    sort_window: int = 0
+    max_in_flight: int = 0
+    unordered: bool = False
+    incremental: bool = False
+    gdex_max_length: int = 0
+    cache_file: str | None = None
+    cache_size: int = 1_000_000
+    stages: tuple[str, ...] = selectable_stages
+    start_method: str = "spawn"
+    outlier_length: int = 0
+    outlier_stages: tuple[str, ...] | None = None
+
+    def __post_init__(self):
+        if self.start_method not in ("spawn", "forkserver"):
+            raise ValueError(f"Unsupported worker start method '{self.start_method}'")
+        if self.start_method == "forkserver" and self.gpus:
+            raise ValueError("Workers forked from a server cannot use GPUs")
+        self.stages = tuple(self.stages)
+        for stage in self.stages:
+            if stage not in selectable_stages:
+                raise ValueError(f"Unknown annotation stage '{stage}'")
+            for required in stage_requirements.get(stage, ()):
+                if required not in self.stages:
+                    raise ValueError(f"Stage '{stage}' requires stage '{required}'")
+        if self.outlier_stages is not None:
+            self.outlier_stages = tuple(self.outlier_stages)
+            for stage in self.outlier_stages:
+                if stage not in self.stages:
+                    raise ValueError(f"Outlier stage '{stage}' is not selected")
+                for required in stage_requirements.get(stage, ()):
+                    if required not in self.outlier_stages:
+                        raise ValueError(
+                            f"Outlier stage '{stage}' requires stage '{required}'"
+                        )
+
+    @property
+    def spacy_model(self):
+        return "de_zdl_dist" if self.gpus else "de_zdl_lg"
+
+    @property
+    def spacy_excluded(self):
+        """spaCy components of stages, which are not selected."""
+        return tuple(
+            component
+            for stage, components in spacy_components.items()
+            if stage not in self.stages
+            for component in components
+        )
+
+    def stage_versions(self):
+        """Versions of enabled stages, identifying their annotations."""
+        zdl_nlp_version = f"zdl_nlp-{__version__}"
+        spacy_version = f"{self.spacy_model}-{dist_version(self.spacy_model)}"
+        versions = {
+            "spacy": "-no_".join((spacy_version, *self.spacy_excluded)),
+            "gdex": dist_version("gdex"),
+            "dwdsmor": dist_version("dwdsmor-dwds", "dwdsmor"),
+            "lingua": dist_version("lingua-language-detector"),
+            "colloc": f"{zdl_nlp_version}+{colloc_rules_digest}",
+            "phrasal_verbs": zdl_nlp_version,
+        }
+        return {k: v for k, v in versions.items() if self.is_enabled(k)}
+
+    def is_enabled(self, stage):
+        if stage in ("input", "spacy"):
+            return True
+        return stage_selections.get(stage, stage) in self.stages
+
+    def batches_in_flight(self):
+        """Limits the # of batches in flight, 1 for single-process pipelines."""
+        if self.n_procs < 0:
+            return 1
+        n_procs = self.n_procs or len(os.sched_getaffinity(0))
+        return self.max_in_flight or 2 * n_procs
+
+    def cache_version(self):
+        """Identifies stage versions and options affecting annotations."""
+        return json.dumps(
+            {
+                "stages": self.stage_versions(),
+                "doc_lang": self.doc_lang,
+                "gdex_max_length": self.gdex_max_length,
+                "outlier_length": self.outlier_length,
+                "outlier_stages": self.outlier_stages,
+            },
+            sort_keys=True,
+        )
 
     def init(self):
+        self.stats = Counter()
         gpu_id = None
         if self.gpus:
             proc = multiprocessing.current_process()
@@ -159,60 +691,524 @@ class Pipeline:
         if gpu_id is not None:
             thinc.api.set_gpu_allocator("pytorch")
             thinc.api.require_gpu(gpu_id)
-        self.spacy = spacy.load("de_zdl_lg" if gpu_id is None else "de_zdl_dist")
+        self.spacy = spacy.load(self.spacy_model, exclude=self.spacy_excluded)
         self.spacy.add_pipe("doc_cleaner")
-        self.dwdsmor = dwdsmor.lemmatizer()
-        self.lingua = (
-            LanguageDetectorBuilder.from_languages(
-                Language.ENGLISH, Language.FRENCH, Language.GERMAN, Language.LATIN
+        self.dwdsmor = None
+        self.dwdsmor_cache = None
+        if self.is_enabled("dwdsmor"):
+            self.dwdsmor = dwdsmor.lemmatizer()
+            if self.lemma_cache_size > 0:
+                self.dwdsmor_cache = LRUCache(self.lemma_cache_size)
+        self.lingua = None
+        self.lingua_executor = None
+        if self.is_enabled("lingua"):
+            # shared by all calls, i. e. also for each batch of outliers
+            self.lingua_executor = ThreadPoolExecutor(1)
+            self.lingua = (
+                LanguageDetectorBuilder.from_languages(
+                    Language.ENGLISH, Language.FRENCH, Language.GERMAN, Language.LATIN
+                )
+                .with_preloaded_language_models()
+                .with_low_accuracy_mode()
+                .build()
             )
-            .with_preloaded_language_models()
-            .with_low_accuracy_mode()
-            .build()
-        )
+        self.versions = self.stage_versions()
+        self.versions_stamp = json.dumps(self.versions)
+        self.outlier_lane = None
+        if self.outlier_length > 0 and self.outlier_stages is not None:
+            lane = replace(
+                self, stages=self.outlier_stages, outlier_length=0, outlier_stages=None
+            )
+            lane.stats = self.stats
+            lane.spacy = self.spacy
+            lane.dwdsmor = self.dwdsmor if lane.is_enabled("dwdsmor") else None
+            lane.dwdsmor_cache = None
+            lane.lingua = self.lingua if lane.is_enabled("lingua") else None
+            lane.lingua_executor = self.lingua_executor
+            lane.versions = lane.stage_versions()
+            lane.versions_stamp = json.dumps(lane.versions)
+            lane.outlier_lane = None
+            self.outlier_lane = lane
         return self
 
+    def annotators(self):
+        """Annotation functions over sentence iterables, by stage."""
+        if self.doc_lang:
+            detect_langs = lingua_detect_documents
+        else:
+            detect_langs = lingua_detect
+        annotators = {
+            "input": lambda sentences: sentences,
+            "spacy": lambda sentences: spacy_pipe(
+                self.spacy,
+                sentences,
+                self.batch_size,
+                self.sort_window,
+                self.batch_tokens,
+                self.is_enabled("gdex"),
+            ),
+            "gdex": lambda sentences: score_gdex(
+                self.spacy, sentences, self.gdex_max_length
+            ),
+            "dwdsmor": lambda sentences: dwdsmor_lemmatize(
+                self.dwdsmor, sentences, self.dwdsmor_cache
+            ),
+            "lingua": lambda sentences: detect_langs(
+                self.lingua, sentences, self.batch_size
+            ),
+            "colloc": lambda sentences: map(extract_collocs, sentences),
+            "phrasal_verbs": lambda sentences: map(collapse_phrasal_verbs, sentences),
+        }
+        return {k: v for k, v in annotators.items() if self.is_enabled(k)}
+
     def __call__(self, sentences):
-        sentences = spacy_pipe(self.spacy, sentences, self.batch_size)
-        sentences = dwdsmor_lemmatize(self.dwdsmor, sentences)
-        sentences = lingua_detect(self.lingua, sentences, self.batch_size)
-        sentences = (extract_collocs(s) for s in sentences)
-        sentences = (collapse_phrasal_verbs(s) for s in sentences)
+        if self.incremental:
+            return self.reannotate(sentences)
+        annotators = self.annotators()
+        if "lingua" in annotators:
+            sentences, annotators["lingua"] = detect_langs_ahead(
+                annotators["lingua"],
+                sentences,
+                self.batch_size,
+                self.doc_lang,
+                self.lingua_executor,
+            )
+        upstream = None
+        for stage, annotate in annotators.items():
+            sentences = annotate(sentences)
+            if self.timings:
+                sentences = upstream = Timed(self.stats, stage, sentences, upstream)
+        return map(self.stamp, sentences)
+
+    def reannotate(self, sentences):
+        """Runs stale stages only, as determined by version stamps."""
+        annotators = self.annotators()
+        for batch in self.batches(sentences):
+            stale = [stale_stages(s, self.versions) for s in batch]
+            for s, s_stale in zip(batch, stale):
+                reset_annotations(s, s_stale)
+            for stage, annotate in annotators.items():
+                stage_batch = [s for s, st in zip(batch, stale) if stage in st]
+                if not stage_batch:
+                    continue
+                stage_batch = annotate(stage_batch)
+                if self.timings:
+                    stage_batch = Timed(self.stats, stage, stage_batch)
+                for _ in stage_batch:
+                    pass
+            self.stats["reannotated_sentences"] += sum(1 for st in stale if st)
+            self.stats["sentences"] += len(batch)
+            yield from map(self.stamp, batch)
+
+    def batches(self, sentences, by_document=False):
+        """Batches sentences by count or, if given, by a budget of tokens.
+
+        Batches of whole documents only exceed count or budget with documents
+        exceeding them on their own.
+        """
+        if by_document:
+            if self.batch_tokens > 0:
+                docs = size_batched(
+                    documents(sentences),
+                    self.batch_tokens,
+                    lambda doc: sum(map(len, doc)),
+                )
+            else:
+                docs = size_batched(documents(sentences), self.batch_size)
+            return ([s for doc in batch for s in doc] for batch in docs)
+        if self.batch_tokens > 0:
+            return size_batched(sentences, self.batch_tokens, len, self.batch_size)
+        return batched(sentences, self.batch_size)
+
+    def annotate_outliers(self, sentences):
+        """Annotates outliers, with the reduced stages of their lane if given."""
+        if self.outlier_lane is None:
+            sentences = list(self(sentences))
+        else:
+            disabled = [
+                c
+                for c in self.outlier_lane.spacy_excluded
+                if c in self.spacy.pipe_names
+            ]
+            with self.spacy.select_pipes(disable=disabled):
+                sentences = list(self.outlier_lane(sentences))
+        self.stats["outlier_sentences"] += len(sentences)
+        self.stats["outlier_tokens"] += sum(len(s) for s in sentences)
         return sentences
 
+    def stamp(self, sentence):
+        sentence.metadata["stages"] = self.versions_stamp
+        return sentence
+
+    def take_stats(self):
+        stats = self.stats
+        self.stats = Counter()
+        if self.outlier_lane is not None:
+            self.outlier_lane.stats = self.stats
+        if self.dwdsmor_cache is not None:
+            for k, v in self.dwdsmor_cache.take_stats().items():
+                stats[f"dwdsmor_cache_{k}"] = v
+        return stats
+
+
+def log_stats(stats):
+    if outliers := stats["outlier_sentences"]:
+        logger.info(
+            f"Routed {outliers:,d} outlier sentences "
+            f"({stats['outlier_tokens']:,d} tokens) to a separate lane"
+        )
+    hits = stats["annotation_cache_hits"]
+    lookups = hits + stats["annotation_cache_misses"]
+    if lookups:
+        logger.info(
+            f"Annotation cache: {lookups:,d} lookups, "
+            f"{hits:,d} hits ({hits / lookups:.1%}), "
+            f"{stats['annotation_cache_evictions']:,d} evictions"
+        )
+    hits = stats["dwdsmor_cache_hits"]
+    lookups = hits + stats["dwdsmor_cache_misses"]
+    if lookups:
+        logger.info(
+            f"DWDSmor cache: {lookups:,d} lookups, "
+            f"{hits:,d} hits ({hits / lookups:.1%}), "
+            f"{stats['dwdsmor_cache_evictions']:,d} evictions"
+        )
+    if n_sentences := stats["sentences"]:
+        reannotated = stats["reannotated_sentences"]
+        logger.info(
+            f"Re-annotated {reannotated:,d} of {n_sentences:,d} sentences "
+            f"({reannotated / n_sentences:.1%})"
+        )
+    timings = stage_timings(stats)
+    total_time = sum(t["time"] for t in timings.values())
+    for stage, t in timings.items():
+        logger.info(
+            f"[{stage:>14s}] {t['time']:>10.2f}s ({t['time'] / total_time:>6.1%}) "
+            f"{t['sentences']:>12,d} sentences {t['tokens']:>14,d} tokens"
+        )
+
+
+pipeline = None
+annotation_cache = None
+stats: Counter[str] = Counter()
+
+
+def pipe_stats():
+    """Statistics of the local pipeline or summed up over a worker pool."""
+    if pipeline is not None:
+        stats.update(pipeline.take_stats())
+    if annotation_cache is not None:
+        for k, v in annotation_cache.take_stats().items():
+            stats[f"annotation_cache_{k}"] += v
+    return stats
+
+
+def report_stats():
+    log_stats(pipe_stats())
+
+
+def pipeline_config(p):
+    return json.dumps(asdict(p), sort_keys=True)
+
+
+def preload_pipe(config):
+    """Initializes a pipeline in a fork server, to be shared by its workers."""
+    global pipeline
+    pipeline = Pipeline(**json.loads(config)).init()
+    # keep the garbage collector from touching (and copying) shared pages
+    gc.freeze()
+
 
 def _init_pipe(pipeline_):
     global pipeline
-    pipeline = pipeline_.init()
+    if pipeline is None or pipeline_config(pipeline) != pipeline_config(pipeline_):
+        pipeline = pipeline_.init()
     return pipeline
 
 
+preload_config_var = "ZDL_NLP_PRELOAD_PIPELINE"
+
+
+def worker_pool(p, n_procs):
+    """Starts a pool of workers, each running an initialized pipeline.
+
+    Spawned workers initialize their own pipelines; workers started via
+    a fork server share the pipeline preloaded by the server copy-on-write.
+    """
+    mp_ctx = multiprocessing.get_context(p.start_method)
+    if p.start_method == "forkserver":
+        os.environ[preload_config_var] = pipeline_config(p)
+        mp_ctx.set_forkserver_preload([f"{__name__}.preload"])
+    return mp_ctx.Pool(n_procs, _init_pipe, (p,))
+
+
+def schedule(pool, fn, batches, max_in_flight, ordered=True, lane=None):
+    """Applies fn to batches in a pool, limiting the # of batches in flight.
+
+    Results are yielded in input order via a reorder buffer or, if not
+    ordered, as soon as they are available. Batches count as being in flight
+    until their results have been yielded.
+
+    Batches waiting in an outlier lane (if given) are submitted once slots are
+    free, up to the lane's share of them, and count as being in flight until
+    annotated. While as many batches as slots are waiting in the lane, no
+    further batches are taken.
+    """
+    batches = enumerate(batches)
+    results = queue.SimpleQueue() if lane is None else lane.results
+    reorder_buffer = {}
+    next_n = 0
+    pending = 0
+    exhausted = False
+
+    def in_flight():
+        return pending + len(reorder_buffer) + (lane.in_flight if lane else 0)
+
+    while True:
+        while in_flight() < max_in_flight:
+            if lane and lane.waiting and lane.in_flight < lane.max_in_flight:
+                lane.submit()
+                continue
+            if exhausted or (lane and len(lane.waiting) >= max_in_flight):
+                break
+            if (next_batch := next(batches, None)) is None:
+                exhausted = True
+                continue
+            n, batch = next_batch
+            pool.apply_async(
+                fn,
+                (batch,),
+                callback=lambda r, n=n: results.put((n, r, None)),
+                error_callback=lambda e, n=n: results.put((n, None, e)),
+            )
+            pending += 1
+        if pending == 0 and not (lane and lane.in_flight):
+            return
+        if (item := results.get()) is None:
+            lane.in_flight -= 1
+            continue
+        n, result, error = item
+        pending -= 1
+        if error is not None:
+            raise error
+        if not ordered:
+            yield result
+            continue
+        reorder_buffer[n] = result
+        while next_n in reorder_buffer:
+            yield reorder_buffer.pop(next_n)
+            next_n += 1
+
+
+class DeferredResult:
+    """Result of a function call, computed once requested."""
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def ready(self):
+        return False
+
+    def get(self):
+        return self.fn(*self.args)
+
+
+class OutlierLane:
+    """Batches of outliers, waiting to be submitted to a pool by `schedule`.
+
+    Outliers have a low priority: they take at most `max_in_flight` of the
+    slots of a schedule, leaving the others to regular batches.
+    """
+
+    def __init__(self, pool, fn, max_in_flight):
+        self.pool = pool
+        self.fn = fn
+        self.max_in_flight = max_in_flight
+        self.waiting = deque()
+        self.in_flight = 0
+        # completions of submitted batches, shared with the schedule
+        self.results = queue.SimpleQueue()
+
+    def add(self, sentences):
+        result = PooledResult(self, pack_sentences(sentences))
+        self.waiting.append(result)
+        return result
+
+    def submit(self, result=None):
+        if result is None:
+            result = self.waiting.popleft()
+        else:
+            self.waiting.remove(result)
+        result.result = self.pool.apply_async(
+            self.fn,
+            (result.batch,),
+            callback=lambda _: self.results.put(None),
+            error_callback=lambda _: self.results.put(None),
+        )
+        self.in_flight += 1
+
+
+class PooledResult:
+    """Annotated sentences of a batch passed to a worker via an outlier lane.
+
+    Batches still waiting in the lane when requested are submitted at once.
+    """
+
+    def __init__(self, lane, batch):
+        self.lane = lane
+        self.batch = batch
+        self.result = None
+
+    def ready(self):
+        return self.result is not None and self.result.ready()
+
+    def get(self):
+        if self.result is None:
+            self.lane.submit(self)
+        batch, batch_stats = self.result.get()
+        stats.update(batch_stats)
+        return unpack_sentences(batch)
+
+
+def routed_pipe(pipe, submit, max_length):
+    """Routes sentences longer than max_length tokens to a separate lane.
+
+    Outliers are submitted for annotation on their own, so they do not hold
+    up batches of other sentences, and are awaited at their position.
+    """
+
+    def routed(sentences):
+        # outlier results with placeholders for other sentences
+        pending = deque()
+
+        def regular():
+            for s in sentences:
+                if len(s) <= max_length:
+                    pending.append(None)
+                    yield s
+                else:
+                    pending.append(submit([s]))
+
+        for s in pipe(regular()):
+            while pending[0] is not None:
+                yield from pending.popleft().get()
+            pending.popleft()
+            yield s
+        for result in pending:
+            yield from result.get()
+
+    return routed
+
+
+def cached_pipe(pipe, cache, chunk_size):
+    """Annotates cached sentences from the cache, others via the given pipe.
+
+    Sentences are looked up in chunks, whose misses are annotated before
+    further sentences are read, so cache hits are buffered per chunk only.
+    Sentences are yielded in input order, keeping documents together.
+    """
+
+    def put(s):
+        cache.put(s)
+        return s
+
+    def cached(sentences):
+        try:
+            for chunk in batched(sentences, chunk_size):
+                found = cache.get(chunk)
+                misses = [s for s, f in zip(chunk, found) if not f]
+                annotated = map(put, pipe(misses) if misses else ())
+                yield from (s if f else next(annotated) for s, f in zip(chunk, found))
+        finally:
+            cache.flush()
+
+    return cached
+
+
 def create_pipe(*args, **kwargs):
+    global annotation_cache
     p = Pipeline(*args, **kwargs)
+    if p.cache_file is not None and p.unordered:
+        # annotated sentences are merged with cached ones by their position
+        p = replace(p, unordered=False)
+    annotate = _create_pipe(p)
+    if p.cache_file is None:
+        return annotate
+    annotation_cache = AnnotationCache(p.cache_file, p.cache_size, p.cache_version())
+    atexit.register(annotation_cache.close)
+    # chunks of sentences to look up span as many batches as may be in flight
+    chunk_size = p.batch_size * p.batches_in_flight()
+    return cached_pipe(annotate, annotation_cache, chunk_size)
+
+
+def _create_pipe(p):
+    # once, as statistics accumulate over all pipes
+    atexit.unregister(report_stats)
+    atexit.register(report_stats)
     if p.n_procs < 0:
         _init_pipe(p)
-        return pipe
+        return local_pipe
 
     n_procs = p.n_procs or len(os.sched_getaffinity(0))
-    mp_ctx = multiprocessing.get_context("spawn")
-    pool = mp_ctx.Pool(n_procs, _init_pipe, (p,))
+    max_in_flight = p.batches_in_flight()
+    # unordered batches and those for detecting languages per document consist
+    # of whole documents, whose sentences are only sorted by workers
+    by_document = p.unordered or p.doc_lang
+    sort_window = 0 if by_document else p.sort_window
+    pool = worker_pool(replace(p, sort_window=0) if sort_window else p, n_procs)
 
-    @atexit.register
-    def terminate_pool():
-        pool.terminate()
+    atexit.register(pool.terminate)
 
-    def pooled_pipe(sentences, pool=pool):
-        batches = batched(sentences, p.batch_size)
-        for batch in pool.imap(as_tuple, batches):
-            for s in batch:
+    def pooled_pipe(sentences, lane=None):
+        batches = p.batches(sentences, by_document)
+        batches = (pack_sentences(batch) for batch in batches)
+        batches = schedule(
+            pool, annotate_batch, batches, max_in_flight, not p.unordered, lane
+        )
+        for batch, batch_stats in batches:
+            stats.update(batch_stats)
+            for s in unpack_sentences(batch):
                 yield s
 
-    return pooled_pipe
+    def routed_pooled_pipe(sentences):
+        lane = OutlierLane(pool, annotate_outliers_batch, max(1, max_in_flight // 4))
+        routed = routed_pipe(
+            lambda sentences: pooled_pipe(sentences, lane), lane.add, p.outlier_length
+        )
+        return routed(sentences)
+
+    # outliers of unordered batches are routed by workers, within documents
+    annotate = pooled_pipe
+    if p.outlier_length > 0 and not p.unordered:
+        annotate = routed_pooled_pipe
+    if sort_window > 0:
+        return lambda sentences: length_sorted(annotate, sentences, sort_window)
+    return annotate
 
 
 def pipe(sentences):
     return pipeline(sentences)
 
 
-def as_tuple(sentences):
-    return tuple(pipe(sentences))
+def local_pipe(sentences):
+    """Annotates sentences in this process, routing outliers if configured."""
+    if pipeline.outlier_length <= 0:
+        return pipe(sentences)
+    routed = routed_pipe(
+        pipe,
+        lambda sentences: DeferredResult(pipeline.annotate_outliers, sentences),
+        pipeline.outlier_length,
+    )
+    return routed(sentences)
+
+
+def annotate_batch(packed):
+    sentences = unpack_sentences(packed)
+    sentences = local_pipe(sentences) if pipeline.unordered else pipe(sentences)
+    return pack_sentences(sentences), pipeline.take_stats()
+
+
+def annotate_outliers_batch(packed):
+    sentences = pipeline.annotate_outliers(unpack_sentences(packed))
+    return pack_sentences(sentences), pipeline.take_stats()
@@ -1,10 +1,12 @@
 import argparse
+import json
+import sys
 
-import conllu
 from tqdm import tqdm
 
-from ..conllu import serialize
-from . import create_pipe
+from ..conllu import parse_incr, write
+from ..daemon import serve
+from . import create_pipe, pipe_stats, selectable_stages, stage_timings
 
 arg_parser = argparse.ArgumentParser(description="Add linguistic annotations")
 arg_parser.add_argument(
@@ -13,9 +15,42 @@ arg_parser.add_argument(
     help="# of sentences to process in one batch (128 by default)",
     type=int,
 )
+arg_parser.add_argument(
+    "--batch-tokens",
+    help="max. # of tokens per batch, besides # of sentences (0/no limit by default)",
+    type=int,
+    default="0",
+)
+arg_parser.add_argument(
+    "--cache-file",
+    help="SQLite database caching annotations of sentences (none by default)",
+)
+arg_parser.add_argument(
+    "--cache-size",
+    help="max. # of sentences in the annotation cache (1000000 by default)",
+    type=int,
+    default="1000000",
+)
+arg_parser.add_argument(
+    "--doc-lang",
+    help="detect languages per document, re-checking deviating sentences only"
+    " (in parallel pipelines, --sort-window only applies within batches)",
+    action="store_true",
+)
 arg_parser.add_argument(
     "-g", "--gpu", help="IDs of GPUs to use (default: none)", type=int, action="append"
 )
+arg_parser.add_argument(
+    "--incremental",
+    help="re-run only stages whose version differs from the sentences' stamps",
+    action="store_true",
+)
+arg_parser.add_argument(
+    "--gdex-max-length",
+    help="skip GDEX scoring of sentences with more tokens (0/no limit by default)",
+    type=int,
+    default="0",
+)
 arg_parser.add_argument(
     "-i",
     "--input-file",
@@ -23,6 +58,18 @@ arg_parser.add_argument(
     type=argparse.FileType("r"),
     default="-",
 )
+arg_parser.add_argument(
+    "--lemma-cache-size",
+    help="# of cached DWDSmor lookups per pipeline (65536 by default, 0 disables)",
+    type=int,
+    default="65536",
+)
+arg_parser.add_argument(
+    "--max-in-flight",
+    help="# of batches queued for parallel pipelines (2 per pipeline by default)",
+    type=int,
+    default="0",
+)
 arg_parser.add_argument(
     "-o",
     "--output-file",
@@ -30,6 +77,16 @@ arg_parser.add_argument(
     type=argparse.FileType("w"),
     default="-",
 )
+arg_parser.add_argument(
+    "--outlier-length",
+    help="# of tokens beyond which sentences are annotated separately (0/off by default)",
+    type=int,
+    default="0",
+)
+arg_parser.add_argument(
+    "--outlier-stages",
+    help="comma-separated annotation stages of outlier sentences (--stages by default)",
+)
 arg_parser.add_argument(
     "-p",
     "--parallel",
@@ -38,6 +95,52 @@ arg_parser.add_argument(
     default="-1",
 )
 arg_parser.add_argument("--progress", help="Show progress", action="store_true")
+arg_parser.add_argument(
+    "--serve",
+    help="serve requests via the given Unix socket, keeping the pipeline loaded",
+    metavar="SOCKET",
+)
+arg_parser.add_argument(
+    "--sort-window",
+    help="# of sentences to sort by length before parsing (0/no sorting by default)",
+    type=int,
+    default="0",
+)
+arg_parser.add_argument(
+    "--unordered",
+    help="output batches of whole documents of parallel pipelines as completed,"
+    " not in input order (unless using an annotation cache)",
+    action="store_true",
+)
+arg_parser.add_argument(
+    "--stages",
+    help=(
+        "comma-separated annotation stages in addition to tagging "
+        f"({','.join(selectable_stages)} by default)"
+    ),
+    default=",".join(selectable_stages),
+)
+arg_parser.add_argument(
+    "--start-method",
+    help=(
+        "how to start parallel pipelines, with 'forkserver' sharing models "
+        "between them ('spawn' by default)"
+    ),
+    choices=("spawn", "forkserver"),
+    default="spawn",
+)
+arg_parser.add_argument(
+    "--timings", help="Record and log per-stage timings", action="store_true"
+)
+arg_parser.add_argument(
+    "--timings-file",
+    help="JSON file to write per-stage timings to (implies --timings)",
+    type=argparse.FileType("w"),
+)
+
+
+def stage_list(s):
+    return tuple(stage.strip() for stage in s.split(",") if stage.strip())
 
 
 args = arg_parser.parse_args()
@@ -45,7 +148,35 @@ args = arg_parser.parse_args()
 gpus = args.gpu
 batch_size = args.batch_size or 128
 n_procs = args.parallel or -1
-pipe = create_pipe(gpus=gpus, batch_size=batch_size, n_procs=n_procs)
+try:
+    pipe = create_pipe(
+        gpus=gpus,
+        batch_size=batch_size,
+        batch_tokens=args.batch_tokens,
+        n_procs=n_procs,
+        lemma_cache_size=args.lemma_cache_size,
+        doc_lang=args.doc_lang,
+        timings=args.timings or args.timings_file is not None,
+        sort_window=args.sort_window,
+        max_in_flight=args.max_in_flight,
+        unordered=args.unordered,
+        incremental=args.incremental,
+        stages=stage_list(args.stages),
+        start_method=args.start_method,
+        outlier_length=args.outlier_length,
+        outlier_stages=(
+            stage_list(args.outlier_stages) if args.outlier_stages is not None else None
+        ),
+        gdex_max_length=args.gdex_max_length,
+        cache_file=args.cache_file,
+        cache_size=args.cache_size,
+    )
+except ValueError as e:
+    arg_parser.error(str(e))
+
+if args.serve:
+    serve(args.serve, pipe)
+    sys.exit()
 
 progress = None
 if args.progress:
@@ -56,7 +187,15 @@ if args.progress:
         smoothing=0.01,
     )
 
-for s in pipe(conllu.parse_incr(args.input_file)):
-    args.output_file.write(serialize(s))
-    if progress is not None:
-        progress.update(len(s))
+
+def tracked(sentences):
+    for s in sentences:
+        yield s
+        if progress is not None:
+            progress.update(len(s))
+
+
+write(tracked(pipe(parse_incr(args.input_file))), args.output_file)
+
+if args.timings_file is not None:
+    json.dump(stage_timings(pipe_stats()), args.timings_file, indent=2)
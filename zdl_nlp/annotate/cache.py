@@ -0,0 +1,151 @@
+import json
+import sqlite3
+from hashlib import sha256
+
+from ..conllu import form_text, is_space_after
+
+_init_sql = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    (
+        "CREATE TABLE IF NOT EXISTS annotation ("
+        "key BLOB PRIMARY KEY,"
+        "annotation TEXT NOT NULL,"
+        "accessed INTEGER NOT NULL"
+        ")"
+    ),
+    "CREATE INDEX IF NOT EXISTS annotation_accessed ON annotation (accessed)",
+)
+
+# annotations added by the pipeline, as opposed to those of the input
+token_fields = ("lemma", "upos", "xpos", "feats", "head", "deprel")
+misc_keys = ("DWDSmor", "CompoundPrt", "CompoundVerb")
+metadata_keys = ("entities", "gdex", "lang", "collocations", "stages")
+
+
+class AnnotationCache:
+    """SQLite-backed cache of sentence annotations, evicting least recently used.
+
+    Sentences are keyed by a hash of their token forms and spacing, prefixed
+    by a pipeline version, which identifies the models and options in use.
+    """
+
+    def __init__(self, db_file, max_size, version, flush_size=1024):
+        self.db = sqlite3.connect(db_file)
+        for stmt in _init_sql:
+            self.db.execute(stmt)
+        self.db.commit()
+        self.max_size = max_size
+        self.version = version
+        self.flush_size = flush_size
+        self.size, self.clock = self.db.execute(
+            "SELECT COUNT(*), COALESCE(MAX(accessed), 0) FROM annotation"
+        ).fetchone()
+        self.pending = {}
+        self.hits = self.misses = self.evictions = 0
+
+    def key(self, sentence):
+        content = "".join(
+            f"{form_text(t)}\x1f{'1' if is_space_after(t) else '0'}\x1e"
+            for t in sentence
+        )
+        return sha256(f"{self.version}\x1d{content}".encode("utf-8")).digest()
+
+    def get(self, sentences):
+        """Annotates cached sentences, returning whether they were found."""
+        keys = [self.key(s) for s in sentences]
+        placeholders = ", ".join("?" for _ in keys)
+        found = dict(
+            self.db.execute(
+                f"SELECT key, annotation FROM annotation WHERE key IN ({placeholders})",
+                keys,
+            )
+        )
+        self.clock += 1
+        with self.db:
+            self.db.executemany(
+                "UPDATE annotation SET accessed = ? WHERE key = ?",
+                ((self.clock, k) for k in found),
+            )
+        results = []
+        for s, k in zip(sentences, keys):
+            annotation = found.get(k) or self.pending.get(k)
+            if annotation is None:
+                self.misses += 1
+                results.append(False)
+                continue
+            self.hits += 1
+            apply_annotation(s, annotation)
+            results.append(True)
+        return results
+
+    def put(self, sentence):
+        self.pending[self.key(sentence)] = extract_annotation(sentence)
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.clock += 1
+        with self.db:
+            changes = self.db.total_changes
+            self.db.executemany(
+                "INSERT OR IGNORE INTO annotation (key, annotation, accessed) "
+                "VALUES (?, ?, ?)",
+                ((k, a, self.clock) for k, a in self.pending.items()),
+            )
+            self.size += self.db.total_changes - changes
+            if self.size > self.max_size:
+                evicted = self.db.execute(
+                    "DELETE FROM annotation WHERE key IN ("
+                    "SELECT key FROM annotation ORDER BY accessed LIMIT ?"
+                    ")",
+                    (self.size - self.max_size,),
+                ).rowcount
+                self.size -= evicted
+                self.evictions += evicted
+        self.pending = {}
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def take_stats(self):
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+        self.hits = self.misses = self.evictions = 0
+        return stats
+
+
+def extract_annotation(sentence):
+    tokens = []
+    for t in sentence:
+        misc = t.get("misc") or {}
+        tokens.append(
+            (
+                *(t.get(f) for f in token_fields),
+                {k: misc[k] for k in misc_keys if k in misc},
+            )
+        )
+    metadata = {
+        k: sentence.metadata[k] for k in metadata_keys if k in sentence.metadata
+    }
+    return json.dumps((tokens, metadata), ensure_ascii=False)
+
+
+def apply_annotation(sentence, annotation):
+    tokens, metadata = json.loads(annotation)
+    for t, (*values, annotated_misc) in zip(sentence, tokens):
+        t.update(zip(token_fields, values))
+        misc = t.get("misc")
+        if misc or annotated_misc:
+            misc = {k: v for k, v in (misc or {}).items() if k not in misc_keys}
+            t["misc"] = misc | annotated_misc
+    for k in metadata_keys:
+        sentence.metadata.pop(k, None)
+    sentence.metadata.update(metadata)
+    return sentence
@@ -0,0 +1,7 @@
+import os
+
+from . import preload_config_var, preload_pipe
+
+# imported by fork servers (see worker_pool)
+if config := os.environ.get(preload_config_var):
+    preload_pipe(config)
@@ -1,5 +1,7 @@
+import inspect
 import json
 from collections import defaultdict
+from hashlib import sha256
 from itertools import chain
 
 from .conllu import feat, form_text, lemma_text
@@ -58,156 +60,78 @@ all_tags = frozenset(
 )
 
 
-pattern_index = defaultdict(lambda: defaultdict(str))  # type: ignore
-for colloc, desc in relations.items():
-    for p in desc.get("patterns", tuple()):  # type: ignore
-        l_p = len(p)
-        assert l_p == 3 or l_p == 5, "Pattern has unknown dimension"
-        if len(p) == 3:
-            r1, t1, t2 = p
-            r_k = r1
-            t_k = (t1.upper(), t2.upper())
-        else:
-            r1, r2, t1, t2, t3 = p
-            r_k = (r1, r2)
-            t_k = (t1.upper(), t2.upper(), t3.upper())  # type: ignore
-        pattern_index[r_k][t_k] = colloc
-
-
-def extract_by_patterns(s):
-    for t_idx, t in enumerate(s):
-        t_n = t_idx + 1
-        t_head_1_n = int(t["head"])
-        if t_head_1_n <= 0:
-            # token is root
-            continue
-        t_head_1 = s[t_head_1_n - 1]
-        t_deprel = t["deprel"]
-        if pattern := pattern_index.get(t_deprel):
-            if colloc := pattern[(t_head_1["upos"], t["upos"])]:
-                yield (colloc, t_head_1_n, t_n)
-        t_head_2_n = int(t_head_1["head"])
-        if t_head_2_n <= 0:
-            # token head is root, cannot make ternary relation
-            continue
-        if pattern := pattern_index.get((t_head_1["deprel"], t_deprel)):
-            t_head_2 = s[t_head_2_n - 1]
-            if colloc := pattern.get((t_head_2["upos"], t_head_1["upos"], t["upos"])):
-                if colloc == "KON":
-                    yield (colloc, t_head_2_n, t_head_1_n)
-                else:
-                    yield (colloc, t_head_2_n, t_head_1_n, t_n)
-
-
-def extract_comparing_groups(s):
+def dependency_index(s):
+    """Maps token IDs to their dependants in sentence order."""
+    index = defaultdict(list)
     for t in s:
-        t_head_1_n = int(t["head"])
-        if (
-            t_head_1_n <= 0
-            or t["deprel"] != "case"
-            or t["upos"] != "CCONJ"
-            or t["form"] not in ["als", "wie"]
-        ):
-            # token is root
-            continue
-        t_head_1 = s[t_head_1_n - 1]
-        t_head_2_n = int(t_head_1["head"])
-        if (
-            t_head_2_n <= 0
-            or t_head_1["deprel"] not in {"obl", "nmod"}
-            or t_head_1["upos"] != "NOUN"
-        ):
-            # token head is root, cannot make ternary relation
-            continue
-        t_head_2 = s[int(t_head_2_n) - 1]
-        if t["form"] == "als":
-            # and t_head_2["upos"] != 'ADJ':
-            # expect relations with 'als' to relate to an adjective
-            # TODO: preferably check for comparative
-            # (https://universaldependencies.org/u/feat/Degree.html)
-            continue
-        if t_head_2["upos"] in {"ADJ", "VERB", "NOUN"}:
-            yield ("KOM", t_head_2_n, t_head_1_n)
+        index[t["head"]].append(t)
+    return index
 
 
-def dependants(s, head):
-    head_n = head["id"]
-    return [t for t in s if t["head"] == head_n]
+def dependants(deps, head):
+    return deps.get(head["id"], ())
 
 
 def has_case(token, case):
     return feat(token, "Case") == case
 
 
-def extract_genitives(s):
-    for t in s:
-        if t["upos"] != "NOUN":
-            continue
-        t_deps_1 = dependants(s, t)
-        for t_dep_1 in t_deps_1:
-            if t_dep_1["deprel"] != "nmod" or t_dep_1["upos"] != "NOUN":
-                continue
-            t_deps_2 = dependants(s, t_dep_1)
-            if not has_case(t_dep_1, "Gen") or not any(
-                has_case(t_dep_2, "Gen") for t_dep_2 in t_deps_2
-            ):
-                continue
-            if any(t_dep_2["deprel"] == "case" for t_dep_2 in t_deps_2):
-                continue
-            yield ("GMOD", t["id"], t_dep_1["id"])
+def has_dependant(deps, head, deprel):
+    return any(t["deprel"] == deprel for t in dependants(deps, head))
 
 
-def extract_active_subjects(s):
-    for t in s:
-        t_deps_1 = dependants(s, t)
-        if any(t["deprel"] == "cop" for t in t_deps_1):
-            continue
-        if t["upos"] not in {"NOUN", "VERB", "ADJ"}:
-            continue
-        for t_dep_1 in t_deps_1:
-            if t_dep_1["deprel"] == "nsubj" and t_dep_1["upos"] == "NOUN":
-                yield ("SUBJA", t["id"], t_dep_1["id"])
+def _has_no_case_marker(deps, head, dep):
+    return not has_dependant(deps, dep, "case")
 
 
-def extract_passive_subjects(s):
-    for t in s:
-        if t["upos"] != "VERB":
-            continue
-        t_deps_1 = dependants(s, t)
-        for t_dep_1 in t_deps_1:
-            if t_dep_1["upos"] != "NOUN" or t_dep_1["deprel"] != "nsubj:pass":
-                continue
-            if any(
-                t_dep_1a["deprel"] == "aux:pass" and t_dep_1a["lemma"] == "werden"
-                for t_dep_1a in t_deps_1
-            ):
-                yield ("SUBJP", t["id"], t_dep_1["id"])
+def _is_genitive_attribute(deps, head, dep):
+    return has_case(dep, "Gen") and any(
+        has_case(t, "Gen") for t in dependants(deps, dep)
+    )
 
 
-def extract_objects(s):
-    for t in s:
-        if t["upos"] != "VERB":
-            continue
-        t_deps_1 = dependants(s, t)
-        for t_dep_1 in t_deps_1:
-            if t_dep_1["deprel"] not in {"obj", "obl:arg"} or t_dep_1["upos"] != "NOUN":
-                continue
-            t_deps_2 = dependants(s, t_dep_1)
-            if any(t_dep_2["deprel"] == "case" for t_dep_2 in t_deps_2):
-                continue
-            colloc = "OBJO"  # t_dep_1["deprel"] == "obl:arg"
-            if t_dep_1["deprel"] == "obj":
-                if not (
-                    has_case(t_dep_1, "Dat")
-                    or has_case(t_dep_1, "Gen")
-                    or any(
-                        t_dep_2["deprel"] != "nmod"
-                        and (has_case(t_dep_2, "Gen") or has_case(t_dep_2, "Dat"))
-                        for t_dep_2 in t_deps_2
-                    )
-                ) or has_case(t_dep_1, "Acc"):
-                    colloc = "OBJ"
-            yield (colloc, t["id"], t_dep_1["id"])
+def _has_no_copula(deps, head, dep):
+    return not has_dependant(deps, head, "cop")
+
+
+def _is_passive(deps, head, dep):
+    return any(
+        t["deprel"] == "aux:pass" and t["lemma"] == "werden"
+        for t in dependants(deps, head)
+    )
+
+
+def _is_accusative_object(deps, head, dep):
+    return not (
+        has_case(dep, "Dat")
+        or has_case(dep, "Gen")
+        or any(
+            t["deprel"] != "nmod" and (has_case(t, "Gen") or has_case(t, "Dat"))
+            for t in dependants(deps, dep)
+        )
+    ) or has_case(dep, "Acc")
+
+
+def _is_other_object(deps, head, dep):
+    return not _is_accusative_object(deps, head, dep)
+
+
+def _is_comparing_particle(deps, head, dep):
+    # expect relations with 'als' to relate to an adjective
+    # TODO: preferably check for comparative
+    # (https://universaldependencies.org/u/feat/Degree.html)
+    return dep["form"] == "wie"
+
+
+def _has_copula(deps, head, dep):
+    return any(
+        t["deprel"] == "cop" and lemma_text(t) in {"werden", "sein", "bleiben"}
+        for t in dependants(deps, head)
+    )
+
+
+def _has_no_head_case_marker(deps, head, dep):
+    return not has_dependant(deps, head, "case")
 
 
 # List of verbs for object predicative relations, guided by
@@ -306,112 +230,360 @@ _pred_verbs = {
 }
 
 
-def _is_probably_comparative(s, token):
-    deps = dependants(s, token)
+_als_verbs = _pred_verbs["als_noun"] | _pred_verbs["als_adj"]
+
+
+def _is_probably_comparative(deps, token):
+    t_deps = dependants(deps, token)
     return any(
         form_text(c) == "mehr" and c["deprel"] in {"advmod", "obj"}
-        for c in chain(deps, chain.from_iterable(dependants(s, d) for d in deps))
+        for c in chain(t_deps, chain.from_iterable(dependants(deps, d) for d in t_deps))
     )
 
 
-def extract_predicatives(s):
-    for t in s:
-        lemma = lemma_text(t)
-        # subject predicative
-        if t["upos"] in {"NOUN", "VERB", "ADJ"}:
-            t_deps = dependants(s, t)
-            if any(
-                c["deprel"] == "cop" and lemma_text(c) in {"werden", "sein", "bleiben"}
-                for c in t_deps
-            ):
-                if not any(c["deprel"] == "case" for c in t_deps):
-                    for t_dep_1 in t_deps:
-                        if t_dep_1["deprel"] == "nsubj" and t_dep_1["upos"] == "NOUN":
-                            yield ("PREDC", t_dep_1["id"], t["id"])
-        # object predicative
-        if t["upos"] == "VERB":
-            t_deps = dependants(s, t)
-            for t_dep_1 in t_deps:
-
-                def t_dep_1_pattern(pos=None, deprel=None, t_dep_1=t_dep_1):
-                    if pos and t_dep_1["upos"] not in pos:
-                        return False
-                    if deprel and t_dep_1["deprel"] not in deprel:
-                        return False
-                    return True
-
-                def t_dep_2_pattern(lemma=None, deprel=None, pos=None, t_dep_1=t_dep_1):
-                    for t_dep_2 in dependants(s, t_dep_1):
-                        if lemma and lemma_text(t_dep_2) not in lemma:
-                            continue
-                        if deprel and t_dep_2["deprel"] not in deprel:
-                            continue
-                        if pos and t_dep_2["upos"] not in pos:
-                            continue
-                        return True
-                    return False
-
-                if t_dep_1_pattern({"VERB"}):
-                    # skip full verbs/particle  + aux
-                    if feat(t_dep_1, "VerbForm") in {"Fin", "Part"}:
-                        if t_dep_2_pattern(pos={"AUX"}):
-                            continue
-                if t_dep_1_pattern({"NOUN"}, {"obl"}):
-                    # case 1: als + NOUN > obl
-                    if (
-                        lemma in _pred_verbs["als_noun"]
-                        or lemma in _pred_verbs["als_adj"]
-                    ):
-                        if _is_probably_comparative(s, t):
-                            continue
-                        if t_dep_2_pattern({"als"}, {"case"}):
-                            yield ("PRED", t_dep_1["id"], t["id"])
-                if t_dep_1_pattern({"ADJ", "VERB"}, {"advcl", "xcomp"}):
-                    # case 2 : als + ADJ > advcl
-                    if lemma in _pred_verbs["als_adj"]:
-                        if _is_probably_comparative(s, t):
-                            continue
-                        if t_dep_2_pattern({"als"}, {"mark", "case"}):
-                            yield ("PRED", t_dep_1["id"], t["id"])
-                if t_dep_1_pattern({"ADJ", "NOUN"}, {"obl", "obj", "xcomp"}):
-                    # case 3: für + ADJ/NOUN > obl/obj/xcomp
-                    if lemma in _pred_verbs["für_adj-noun"]:
-                        if t_dep_2_pattern({"für"}, {"case"}):
-                            yield ("PRED", t_dep_1["id"], t["id"])
-                if t_dep_1_pattern({"ADJ", "VERB"}, {"advcl"}):
-                    # case 4: wie + NOUN/ADJ/VERB > obl/advcl
-                    if lemma in _pred_verbs["wie_adj-noun"]:
-                        if t_dep_2_pattern({"wie"}, {"case", "mark"}):
-                            yield ("PRED", t_dep_1["id"], t["id"])
-                if t_dep_1_pattern({"ADJ"}) and not t_dep_2_pattern({"als", "wie"}):
-                    # case 5: verb + adj ohne als/wie
-                    if lemma == "lassen" and t_dep_1["deprel"] == "xcomp":
-                        yield ("PRED", t_dep_1["id"], t["id"])
-                    elif lemma == "aussehen" and t_dep_1["deprel"] == "advcl":
-                        yield ("PRED", t_dep_1["id"], t["id"])
-                    elif lemma == "bleiben" and t_dep_1["deprel"] == "xcomp":
-                        subjects = [
-                            subj
-                            for subj in t_deps
-                            if subj["upos"] in {"ADJ", "NOUN", "VERB"}
-                            and subj["deprel"] == "nsubj"
-                        ]
-                        if len(subjects) == 1:
-                            yield ("PREDC", t_dep_1["id"], subjects[0]["id"])
+def _is_predicative_candidate(deps, head, dep):
+    # skip full verbs/particle  + aux
+    if (
+        dep["upos"] == "VERB"
+        and feat(dep, "VerbForm") in {"Fin", "Part"}
+        and any(t["upos"] == "AUX" for t in dependants(deps, dep))
+    ):
+        return False
+    # skip comparatives in place of als + ADJ/NOUN
+    lemma = lemma_text(head)
+    if (dep["upos"] == "NOUN" and dep["deprel"] == "obl" and lemma in _als_verbs) or (
+        dep["upos"] in {"ADJ", "VERB"}
+        and dep["deprel"] in {"advcl", "xcomp"}
+        and lemma in _pred_verbs["als_adj"]
+    ):
+        return not _is_probably_comparative(deps, head)
+    return True
+
+
+def _marked_by(lemmata, deprels=None):
+    def is_marked(deps, head, dep):
+        return any(
+            lemma_text(t) in lemmata and (not deprels or t["deprel"] in deprels)
+            for t in dependants(deps, dep)
+        )
+
+    return is_marked
+
+
+def _unmarked_by(lemmata):
+    is_marked = _marked_by(lemmata)
+
+    def is_unmarked(deps, head, dep):
+        return not is_marked(deps, head, dep)
+
+    return is_unmarked
+
+
+def _sole_subject(deps, head, dep):
+    subjects = [
+        subj
+        for subj in dependants(deps, head)
+        if subj["upos"] in {"ADJ", "NOUN", "VERB"} and subj["deprel"] == "nsubj"
+    ]
+    if len(subjects) == 1:
+        return (dep["id"], subjects[0]["id"])
+
+
+def pattern_rules():
+    for colloc, desc in relations.items():
+        for p in desc.get("patterns", tuple()):  # type: ignore
+            l_p = len(p)
+            assert l_p == 3 or l_p == 5, "Pattern has unknown dimension"
+            if l_p == 3:
+                r1, t1, t2 = p
+                yield {"relation": colloc, "dep": ((r1,), (t2,)), "head": (t1,)}
+    for colloc, desc in relations.items():
+        for p in desc.get("patterns", tuple()):  # type: ignore
+            if len(p) == 5:
+                r1, r2, t1, t2, t3 = p
+                yield {
+                    "relation": colloc,
+                    "dep": ((r2,), (t3,)),
+                    "head": (t2,),
+                    "head_deprel": (r1,),
+                    "head_2": (t1,),
+                    "collocates": (
+                        ("head_2", "head")
+                        if colloc == "KON"
+                        else ("head_2", "head", "dep")
+                    ),
+                }
+
+
+# Rules match a dependant by its (deprel, tag) and optionally its head
+# (by tag, deprel and lemma), the head's head (by tag) and a sequence of
+# conditions. Rules are grouped and collocations emitted group by group,
+# ordered by the position of either the dependant or the head.
+rules = (
+    ("dependant", tuple(pattern_rules())),
+    (
+        "dependant",
+        (
+            {
+                "relation": "KOM",
+                "dep": (("case",), ("cconj",)),
+                "head": ("noun",),
+                "head_deprel": ("obl", "nmod"),
+                "head_2": ("adj", "verb", "noun"),
+                "if": (_is_comparing_particle,),
+                "collocates": ("head_2", "head"),
+            },
+        ),
+    ),
+    (
+        "head",
+        (
+            {
+                "relation": "GMOD",
+                "dep": (("nmod",), ("noun",)),
+                "head": ("noun",),
+                "if": (_is_genitive_attribute, _has_no_case_marker),
+            },
+        ),
+    ),
+    (
+        "head",
+        (
+            {
+                "relation": "SUBJA",
+                "dep": (("nsubj",), ("noun",)),
+                "head": ("noun", "verb", "adj"),
+                "if": (_has_no_copula,),
+            },
+        ),
+    ),
+    (
+        "head",
+        (
+            {
+                "relation": "SUBJP",
+                "dep": (("nsubj:pass",), ("noun",)),
+                "head": ("verb",),
+                "if": (_is_passive,),
+            },
+        ),
+    ),
+    (
+        "head",
+        (
+            {
+                "relation": "OBJ",
+                "dep": (("obj",), ("noun",)),
+                "head": ("verb",),
+                "if": (_has_no_case_marker, _is_accusative_object),
+            },
+            {
+                "relation": "OBJO",
+                "dep": (("obj",), ("noun",)),
+                "head": ("verb",),
+                "if": (_has_no_case_marker, _is_other_object),
+            },
+            {
+                "relation": "OBJO",
+                "dep": (("obl:arg",), ("noun",)),
+                "head": ("verb",),
+                "if": (_has_no_case_marker,),
+            },
+        ),
+    ),
+    (
+        "head",
+        (
+            # subject predicative
+            {
+                "relation": "PREDC",
+                "dep": (("nsubj",), ("noun",)),
+                "head": ("noun", "verb", "adj"),
+                "if": (_has_copula, _has_no_head_case_marker),
+                "collocates": ("dep", "head"),
+            },
+            # object predicative, case 1: als + NOUN > obl
+            {
+                "relation": "PRED",
+                "dep": (("obl",), ("noun",)),
+                "head": ("verb",),
+                "head_lemmata": _als_verbs,
+                "if": (_is_predicative_candidate, _marked_by({"als"}, {"case"})),
+                "collocates": ("dep", "head"),
+                "phase": 1,
+            },
+            # case 2 : als + ADJ > advcl
+            {
+                "relation": "PRED",
+                "dep": (("advcl", "xcomp"), ("adj", "verb")),
+                "head": ("verb",),
+                "head_lemmata": _pred_verbs["als_adj"],
+                "if": (
+                    _is_predicative_candidate,
+                    _marked_by({"als"}, {"mark", "case"}),
+                ),
+                "collocates": ("dep", "head"),
+                "phase": 1,
+            },
+            # case 3: für + ADJ/NOUN > obl/obj/xcomp
+            {
+                "relation": "PRED",
+                "dep": (("obl", "obj", "xcomp"), ("adj", "noun")),
+                "head": ("verb",),
+                "head_lemmata": _pred_verbs["für_adj-noun"],
+                "if": (_is_predicative_candidate, _marked_by({"für"}, {"case"})),
+                "collocates": ("dep", "head"),
+                "phase": 1,
+            },
+            # case 4: wie + NOUN/ADJ/VERB > obl/advcl
+            {
+                "relation": "PRED",
+                "dep": (("advcl",), ("adj", "verb")),
+                "head": ("verb",),
+                "head_lemmata": _pred_verbs["wie_adj-noun"],
+                "if": (
+                    _is_predicative_candidate,
+                    _marked_by({"wie"}, {"case", "mark"}),
+                ),
+                "collocates": ("dep", "head"),
+                "phase": 1,
+            },
+            # case 5: verb + adj ohne als/wie
+            {
+                "relation": "PRED",
+                "dep": (("xcomp",), ("adj",)),
+                "head": ("verb",),
+                "head_lemmata": {"lassen"},
+                "if": (_is_predicative_candidate, _unmarked_by({"als", "wie"})),
+                "collocates": ("dep", "head"),
+                "phase": 1,
+            },
+            {
+                "relation": "PRED",
+                "dep": (("advcl",), ("adj",)),
+                "head": ("verb",),
+                "head_lemmata": {"aussehen"},
+                "if": (_is_predicative_candidate, _unmarked_by({"als", "wie"})),
+                "collocates": ("dep", "head"),
+                "phase": 1,
+            },
+            {
+                "relation": "PREDC",
+                "dep": (("xcomp",), ("adj",)),
+                "head": ("verb",),
+                "head_lemmata": {"bleiben"},
+                "if": (_is_predicative_candidate, _unmarked_by({"als", "wie"})),
+                "collocates": _sole_subject,
+                "phase": 1,
+            },
+        ),
+    ),
+)
 
 
-def extract_collocs(s):
-    collocs = tuple(
-        chain(
-            extract_by_patterns(s),
-            extract_comparing_groups(s),
-            extract_genitives(s),
-            extract_active_subjects(s),
-            extract_passive_subjects(s),
-            extract_objects(s),
-            extract_predicatives(s),
-        )
+def _tag_set(tags):
+    return frozenset(t.upper() for t in tags) if tags else None
+
+
+def compile_rules(rules):
+    """Indexes rules by the (deprel, tag) of the dependant they match."""
+    rule_index = defaultdict(list)
+    rule_n = 0
+    for group_n, (order, group) in enumerate(rules):
+        assert order in {"dependant", "head"}, "Rule group has unknown order"
+        for rule in group:
+            deprels, tags = rule["dep"]
+            compiled = {
+                "relation": rule["relation"],
+                "head": _tag_set(rule.get("head")),
+                "head_deprel": frozenset(rule.get("head_deprel", ())) or None,
+                "head_2": _tag_set(rule.get("head_2")),
+                "head_lemmata": rule.get("head_lemmata"),
+                "if": rule.get("if", ()),
+                "collocates": rule.get("collocates", ("head", "dep")),
+                "group": group_n,
+                "by_head": order == "head",
+                "phase": rule.get("phase", 0),
+                "n": rule_n,
+            }
+            rule_n += 1
+            for deprel in deprels:
+                for tag in tags:
+                    rule_index[(deprel, tag.upper())].append(compiled)
+    return dict(rule_index)
+
+
+rule_index = compile_rules(rules)
+
+
+def _canonical_rule_value(v):
+    """Serializes sets in order and conditions by their source and closure."""
+    if isinstance(v, (set, frozenset)):
+        return sorted(v)
+    if callable(v):
+        return {
+            "name": v.__qualname__,
+            "source": inspect.getsource(v),
+            "closure": [cell.cell_contents for cell in v.__closure__ or ()],
+        }
+    raise TypeError(f"Cannot serialize rule value {v!r}")
+
+
+def digest_rules(rules):
+    serialized = json.dumps(
+        rules, default=_canonical_rule_value, ensure_ascii=False, sort_keys=True
     )
-    if collocs:
-        s.metadata["collocations"] = json.dumps(collocs)
+    return sha256(serialized.encode("utf-8")).hexdigest()[:12]
+
+
+# identifies the extraction rules in version stamps of annotations
+rules_digest = digest_rules(rules)
+
+
+def match_rule(rule, s, deps, head_n, dep_n):
+    head = s[head_n - 1]
+    dep = s[dep_n - 1]
+    if rule["head"] and head["upos"] not in rule["head"]:
+        return None
+    if rule["head_deprel"] and head["deprel"] not in rule["head_deprel"]:
+        return None
+    head_2_n = None
+    if rule["head_2"]:
+        head_2_n = int(head["head"])
+        if head_2_n <= 0:
+            # token head is root, cannot make ternary relation
+            return None
+        if s[head_2_n - 1]["upos"] not in rule["head_2"]:
+            return None
+    if rule["head_lemmata"] and lemma_text(head) not in rule["head_lemmata"]:
+        return None
+    if not all(condition(deps, head, dep) for condition in rule["if"]):
+        return None
+    collocates = rule["collocates"]
+    if callable(collocates):
+        return collocates(deps, head, dep)
+    positions = {"head": head_n, "head_2": head_2_n, "dep": dep_n}
+    return tuple(positions[c] for c in collocates)
+
+
+def extract_collocs(s):
+    deps = dependency_index(s)
+    matches = []
+    for dep_n, dep in enumerate(s, 1):
+        head_n = int(dep["head"])
+        if head_n <= 0:
+            # token is root
+            continue
+        for rule in rule_index.get((dep["deprel"], dep["upos"]), ()):
+            collocates = match_rule(rule, s, deps, head_n, dep_n)
+            if not collocates:
+                continue
+            if rule["by_head"]:
+                k = (rule["group"], head_n, rule["phase"], dep_n, rule["n"])
+            else:
+                k = (rule["group"], dep_n, rule["n"])
+            matches.append((k, (rule["relation"], *collocates)))
+    if matches:
+        matches.sort(key=lambda m: m[0])
+        s.metadata["collocations"] = json.dumps(tuple(c for _, c in matches))
     return s
@@ -0,0 +1,288 @@
+"""Columnar, binary corpus archives with random access.
+
+An archive holds the token fields of CoNLL-U sentences as arrays of integer
+codes into per-field string dictionaries, sentence metadata as key/value
+codes and offset tables mapping documents to sentences, sentences to tokens
+and metadata entries. All arrays are written in little-endian byte order and
+can be scanned from a memory-mapped file without decoding other columns.
+"""
+
+import argparse
+import gzip
+import json
+import mmap
+import sys
+from array import array
+from itertools import batched
+
+from conllu.parser import DEFAULT_FIELDS, parse_comment_line
+
+from .conllu import parse_block, parse_token, read_blocks, serialize_token
+
+magic = b"ZDLCOLS1"
+
+token_columns = tuple(f"token.{f}" for f in DEFAULT_FIELDS)
+metadata_columns = ("metadata.key", "metadata.value")
+
+
+def token_values(line):
+    values = line.split("\t")
+    if len(values) != len(DEFAULT_FIELDS) or "  " in line:
+        values = serialize_token(parse_token(line)).split("\t")
+    return values
+
+
+def write(blocks, f):
+    """Writes sentences, given as blocks of CoNLL-U lines, as an archive."""
+    columns = {c: array("I") for c in (*token_columns, *metadata_columns)}
+    dictionaries = {c: {} for c in columns}
+    token_codes = tuple((columns[c], dictionaries[c]) for c in token_columns)
+    key_codes, value_codes = (columns[c] for c in metadata_columns)
+    keys, values = (dictionaries[c] for c in metadata_columns)
+    sentence_tokens = array("Q", (0,))
+    sentence_metadata = array("Q", (0,))
+    document_sentences = array("Q")
+    for sn, block in enumerate(blocks):
+        new_doc = sn == 0
+        for line in block:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                for k, v in parse_comment_line(line):
+                    new_doc = new_doc or k == "newdoc id"
+                    key_codes.append(keys.setdefault(k, len(keys)))
+                    v = v or ""
+                    value_codes.append(values.setdefault(v, len(values)))
+                continue
+            for (codes, strings), v in zip(token_codes, token_values(line)):
+                codes.append(strings.setdefault(v, len(strings)))
+        if new_doc:
+            document_sentences.append(sn)
+        sentence_tokens.append(len(token_codes[0][0]))
+        sentence_metadata.append(len(key_codes))
+    document_sentences.append(len(sentence_tokens) - 1)
+
+    sections = {
+        "sentence.tokens": sentence_tokens,
+        "sentence.metadata": sentence_metadata,
+        "document.sentences": document_sentences,
+    }
+    for c, codes in columns.items():
+        strings = [s.encode("utf-8") for s in dictionaries[c]]
+        offsets = array("Q", (0,))
+        for s in strings:
+            offsets.append(offsets[-1] + len(s))
+        # narrowest code type for the dictionary's size
+        typecode = (
+            "B" if len(strings) <= 0xFF else "H" if len(strings) <= 0xFFFF else "I"
+        )
+        sections[c] = array(typecode, codes) if typecode != "I" else codes
+        sections[f"{c}.dictionary"] = offsets
+        sections[f"{c}.strings"] = b"".join(strings)
+
+    f.write(magic)
+    offset = len(magic)
+    index = {}
+    for name, data in sections.items():
+        if isinstance(data, array):
+            typecode = data.typecode
+            if sys.byteorder == "big":
+                data = array(typecode, data)
+                data.byteswap()
+            data = data.tobytes()
+        else:
+            typecode = None
+        padding = -offset % 8
+        f.write(b"\0" * padding)
+        offset += padding
+        index[name] = (offset, len(data), typecode)
+        f.write(data)
+        offset += len(data)
+    footer = json.dumps(
+        {"sections": index, "fields": DEFAULT_FIELDS}, separators=(",", ":")
+    ).encode("utf-8")
+    f.write(footer)
+    f.write(len(footer).to_bytes(8, "little"))
+    f.write(magic)
+    return len(sentence_tokens) - 1
+
+
+class Archive:
+    """Memory-mapped, read-only access to an archive."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self.mmap)
+        self.columns = {}
+        self.dictionaries = {}
+        if self.data[: len(magic)] != magic or self.data[-len(magic) :] != magic:
+            self.close()
+            raise ValueError(f"{path} is not a columnar corpus archive")
+        footer_end = len(self.data) - len(magic) - 8
+        footer_size = int.from_bytes(self.data[footer_end : footer_end + 8], "little")
+        footer = json.loads(bytes(self.data[footer_end - footer_size : footer_end]))
+        self.sections = footer["sections"]
+        self.fields = tuple(footer["fields"])
+        self.sentence_tokens = self.column("sentence.tokens")
+        self.sentence_metadata = self.column("sentence.metadata")
+        self.document_sentences = self.column("document.sentences")
+
+    def close(self):
+        """Unmaps the archive; views of its columns must not be used anymore."""
+        for view in self.columns.values():
+            view.release()
+        self.columns = {}
+        self.data.release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            # slices of columns are still referenced, the archive is unmapped
+            # once they are collected
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.sentence_tokens) - 1
+
+    @property
+    def n_tokens(self):
+        return self.sentence_tokens[-1]
+
+    @property
+    def n_documents(self):
+        return len(self.document_sentences) - 1
+
+    def column(self, name):
+        """View of an array, i. e. the codes of a token column.
+
+        Slices of the view keep the archive mapped until they are collected.
+        """
+        if (view := self.columns.get(name)) is None:
+            offset, size, typecode = self.sections[name]
+            view = self.data[offset : offset + size]
+            if typecode is not None:
+                if sys.byteorder == "big":
+                    codes = array(typecode, view)
+                    codes.byteswap()
+                    view = memoryview(codes)
+                else:
+                    view = view.cast(typecode)
+            self.columns[name] = view
+        return view
+
+    def dictionary(self, name):
+        """Decoded strings of a column's dictionary, indexed by their code."""
+        if (strings := self.dictionaries.get(name)) is None:
+            offsets = self.column(f"{name}.dictionary")
+            data = bytes(self.column(f"{name}.strings"))
+            strings = [
+                data[start:end].decode("utf-8")
+                for start, end in zip(offsets, offsets[1:])
+            ]
+            self.dictionaries[name] = strings
+        return strings
+
+    def scan(self, field, start=0, stop=None):
+        """Values of a token field, decoding only this column."""
+        name = f"token.{field}"
+        codes = self.column(name)
+        start = self.sentence_tokens[start]
+        stop = self.sentence_tokens[len(self) if stop is None else stop]
+        # indexes the column instead of slicing it, so it can be released
+        codes = map(codes.__getitem__, range(start, stop))
+        return map(self.dictionary(name).__getitem__, codes)
+
+    def block(self, sn):
+        """CoNLL-U lines of a sentence."""
+        m_start, m_end = self.sentence_metadata[sn : sn + 2]
+        t_start, t_end = self.sentence_tokens[sn : sn + 2]
+        keys, values = (self.dictionary(c) for c in metadata_columns)
+        key_codes, value_codes = (
+            self.column(c)[m_start:m_end] for c in metadata_columns
+        )
+        lines = []
+        for k, v in zip(key_codes, value_codes):
+            k, v = keys[k], values[v]
+            lines.append(f"# {k} = {v}" if v else f"# {k}")
+        columns = [
+            map(self.dictionary(c).__getitem__, self.column(c)[t_start:t_end])
+            for c in token_columns
+        ]
+        lines.extend(map("\t".join, zip(*columns)))
+        return lines
+
+    def blocks(self, start=0, stop=None):
+        for sn in range(start, len(self) if stop is None else stop):
+            yield self.block(sn)
+
+    def sentence(self, sn):
+        return parse_block(self.block(sn))
+
+    def sentences(self, start=0, stop=None):
+        return map(parse_block, self.blocks(start, stop))
+
+    def document(self, dn):
+        """Sentence blocks of a document, i. e. for indexing."""
+        return list(self.blocks(*self.document_sentences[dn : dn + 2]))
+
+    def documents(self):
+        return map(self.document, range(self.n_documents))
+
+
+def open_input(path):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def to_conllu(archive, f, batch_size=256):
+    """Writes all sentences of an archive in CoNLL-U format."""
+    for batch in batched(archive.blocks(), batch_size):
+        f.write("".join(["\n".join(block) + "\n\n" for block in batch]))
+
+
+conllu2columns_arg_parser = argparse.ArgumentParser(
+    description="Convert CoNLL-U to a columnar corpus archive"
+)
+conllu2columns_arg_parser.add_argument(
+    "-i",
+    "--input-file",
+    help="CoNLL-U input file, optionally gzip-compressed (stdin by default)",
+    default="-",
+)
+conllu2columns_arg_parser.add_argument("archive", help="Archive file to write")
+
+
+def conllu2columns():
+    args = conllu2columns_arg_parser.parse_args()
+    with open_input(args.input_file) as input_file, open(args.archive, "wb") as f:
+        write(read_blocks(input_file), f)
+
+
+columns2conllu_arg_parser = argparse.ArgumentParser(
+    description="Convert a columnar corpus archive to CoNLL-U"
+)
+columns2conllu_arg_parser.add_argument("archive", help="Archive file to read")
+columns2conllu_arg_parser.add_argument(
+    "-o",
+    "--output-file",
+    help="CoNLL-U output file (stdout by default)",
+    type=argparse.FileType("w"),
+    default="-",
+)
+
+
+def columns2conllu():
+    args = columns2conllu_arg_parser.parse_args()
+    with Archive(args.archive) as archive:
+        to_conllu(archive, args.output_file)
@@ -1,19 +1,69 @@
+import io
 import json
-
-from conllu.parser import DEFAULT_FIELDS
+import sys
+from collections.abc import MutableMapping
+from itertools import batched
+from operator import attrgetter, is_, itemgetter
+
+from conllu.models import Metadata, Token, TokenList
+from conllu.parser import (
+    DEFAULT_FIELD_PARSERS,
+    DEFAULT_FIELDS,
+    parse_comment_line,
+    parse_id_value,
+    parse_int_value,
+    parse_line,
+    parse_paired_list_value,
+)
 from conllu.serializer import serialize_field
 
 
+def is_same(a, b):
+    return len(a) == len(b) and all(map(is_, a, b))
+
+
+def cached_view(sentence, name, key, compute):
+    """Memoizes a view derived from a sentence, as long as its key is unchanged.
+
+    Keys are tuples of the metadata values and tokens a view is derived from,
+    compared by identity: Replacing them invalidates the view, changing tokens
+    in place requires calling `invalidate_views()`.
+    """
+    attrs = getattr(sentence, "__dict__", None)
+    if attrs is None:
+        return compute(sentence)
+    views = attrs.setdefault("_views", {})
+    cached = views.get(name)
+    if cached is not None and is_same(cached[0], key):
+        return cached[1]
+    value = compute(sentence)
+    views[name] = (key, value)
+    return value
+
+
+def invalidate_views(sentence):
+    getattr(sentence, "__dict__", {}).pop("_views", None)
+
+
+def metadata_view(sentence, k, parse, default):
+    v = sentence.metadata.get(k)
+    return cached_view(sentence, k, (v,), lambda _s: default if v is None else parse(v))
+
+
 def hit_set(sentence):
-    return set(json.loads(sentence.metadata.get("hits", "[]")))
+    return metadata_view(
+        sentence, "hits", lambda v: frozenset(json.loads(v)), frozenset()
+    )
 
 
 def gdex_score(sentence):
-    return float(sentence.metadata.get("gdex", "0.0"))
+    return metadata_view(sentence, "gdex", float, 0.0)
 
 
 def collocs(sentence):
-    return json.loads(sentence.metadata.get("collocations", "[]"))
+    return metadata_view(
+        sentence, "collocations", lambda v: tuple(map(tuple, json.loads(v))), ()
+    )
 
 
 def hit_collocs(sentence, hits=None, collocations=None):
@@ -52,7 +102,9 @@ def token_text(token):
 
 
 def text(sentence):
-    return "".join(token_text(t) for t in sentence)
+    return cached_view(
+        sentence, "text", tuple(sentence), lambda s: "".join(token_text(t) for t in s)
+    )
 
 
 def marked_token_text(token, tag="t"):
@@ -62,6 +114,16 @@ def marked_token_text(token, tag="t"):
 
 
 def marked_text(sentence, mark_collocations=False):
+    md = sentence.metadata
+    return cached_view(
+        sentence,
+        "marked_text_c" if mark_collocations else "marked_text",
+        (md.get("hits"), md.get("collocations"), *sentence),
+        lambda s: compute_marked_text(s, mark_collocations),
+    )
+
+
+def compute_marked_text(sentence, mark_collocations):
     if hits := hit_set(sentence):
         collocs = hit_collocs(sentence, hits) if mark_collocations else tuple()
         collocs = set(t["id"] for t, _c in collocs)
@@ -78,19 +140,315 @@ def marked_text(sentence, mark_collocations=False):
         return text(sentence)
 
 
+_default_fields = itemgetter(*DEFAULT_FIELDS)
+_default_attrs = attrgetter(*DEFAULT_FIELDS)
+
+
+def serialize_dict(d):
+    if not d:
+        return "_"
+    for v in d.values():
+        if v.__class__ is not str or not v:
+            return serialize_field(d)
+    return "|".join([f"{k}={v}" for k, v in d.items()])
+
+
+def serialize_value(v):
+    if v.__class__ is str:
+        return v
+    if v is None:
+        return "_"
+    if v.__class__ is int:
+        return str(v)
+    if v.__class__ is dict:
+        return serialize_dict(v)
+    return serialize_field(v)
+
+
+def serialize_token(token):
+    try:
+        if token.__class__ is CompactToken:
+            values = _default_attrs(token)
+        else:
+            values = _default_fields(token)
+    except (KeyError, AttributeError):
+        values = [token.get(k) for k in DEFAULT_FIELDS]
+    return "\t".join([v if v.__class__ is str else serialize_value(v) for v in values])
+
+
 def serialize(sentence):
-    lines = []
+    """Serializes a sentence in CoNLL-U format, with fast paths for common types.
 
+    Strings, integers, empty fields and dicts of strings (feats, misc) are
+    formatted directly, all other values via conllu's serializer.
+    """
+    lines = []
     if sentence.metadata:
-        for key, value in sentence.metadata.items():
-            if value:
-                line = f"# {key} = {value}"
-            else:
-                line = f"# {key}"
-            lines.append(line)
+        lines = [
+            f"# {key} = {value}" if value else f"# {key}"
+            for key, value in sentence.metadata.items()
+        ]
+    lines.extend([serialize_token(t) for t in sentence])
+    return "\n".join(lines) + "\n\n"
 
-    for token in sentence:
-        line = "\t".join(serialize_field(token.get(k)) for k in DEFAULT_FIELDS)
-        lines.append(line)
 
-    return "\n".join(lines) + "\n\n"
+def write(sentences, f, batch_size=256):
+    """Writes serialized sentences to a file, in chunks of sentences."""
+    for batch in batched(sentences, batch_size):
+        f.write("".join([serialize(s) for s in batch]))
+
+
+def read_blocks(lines):
+    """Yields the (unparsed) lines of each sentence in a CoNLL-U stream."""
+    block = []
+    for line in lines:
+        if line.isspace() or not line:
+            if block:
+                yield block
+                block = []
+        else:
+            block.append(line)
+    if block:
+        yield block
+
+
+def read_docs(lines):
+    """Yields lists of sentence blocks, grouped by their `newdoc id`."""
+    doc = []
+    for block in read_blocks(lines):
+        for line in block:
+            if not line.startswith("#"):
+                break
+            if line.startswith("# newdoc id") and doc:
+                yield doc
+                doc = []
+                break
+        doc.append(block)
+    if doc:
+        yield doc
+
+
+def parse_dict(value):
+    if not value or value == "_":
+        return None
+    d = {}
+    for part in value.split("|"):
+        k, eq, v = part.partition("=")
+        if not k or k == "_":
+            continue
+        if eq:
+            v = v.partition("=")[0]
+            d[k] = v if v and v != "_" else None
+        else:
+            d[k] = ""
+    return d
+
+
+def parse_values(line):
+    """Field values of a token line with the default fields, None otherwise."""
+    values = line.split("\t")
+    if len(values) != 10 or "  " in line:
+        return None
+    id_, form, lemma, upos, xpos, feats, head, deprel, deps, misc = values
+    return (
+        int(id_) if id_.isascii() and id_.isdigit() else parse_id_value(id_),
+        form,
+        lemma,
+        upos,
+        xpos if xpos and xpos != "_" else None,
+        parse_dict(feats),
+        int(head) if head.isascii() and head.isdigit() else parse_int_value(head),
+        deprel,
+        None if deps == "_" else parse_paired_list_value(deps),
+        parse_dict(misc),
+    )
+
+
+def parse_token(line):
+    values = parse_values(line)
+    if values is None:
+        return parse_line(line, DEFAULT_FIELDS, DEFAULT_FIELD_PARSERS.copy())
+    return Token(zip(DEFAULT_FIELDS, values))
+
+
+_compact_fields = frozenset(DEFAULT_FIELDS)
+
+
+class CompactToken(MutableMapping):
+    """Token with its fields in slots, i. e. for holding large corpora in memory.
+
+    Behaves like a token dict, with unset fields being absent keys. Only the
+    default CoNLL-U fields can be set.
+    """
+
+    __slots__ = DEFAULT_FIELDS
+
+    def __init__(self, fields=()):
+        if fields:
+            self.update(fields)
+
+    def __getitem__(self, k):
+        if k not in _compact_fields:
+            raise KeyError(k)
+        try:
+            return getattr(self, k)
+        except AttributeError:
+            raise KeyError(k) from None
+
+    def get(self, k, default=None):
+        if k not in _compact_fields:
+            return default
+        return getattr(self, k, default)
+
+    def __setitem__(self, k, v):
+        if k not in _compact_fields:
+            raise KeyError(k)
+        setattr(self, k, v)
+
+    def __delitem__(self, k):
+        if k not in _compact_fields:
+            raise KeyError(k)
+        try:
+            delattr(self, k)
+        except AttributeError:
+            raise KeyError(k) from None
+
+    def __contains__(self, k):
+        return k in _compact_fields and hasattr(self, k)
+
+    def __iter__(self):
+        return (k for k in DEFAULT_FIELDS if hasattr(self, k))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"CompactToken({dict(self)!r})"
+
+
+class CompactSentence(TokenList):
+    """Sentence of compact tokens, which are kept as they are."""
+
+    def __init__(self, tokens=None, metadata=None, default_fields=None):
+        list.__init__(self, tokens or ())
+        self.metadata = metadata or Metadata()
+        self.default_fields = default_fields
+
+
+def intern_value(v):
+    if v.__class__ is str:
+        return sys.intern(v)
+    if v.__class__ is dict:
+        return {sys.intern(k): intern_value(dv) for k, dv in v.items()}
+    return v
+
+
+def compact_token(token):
+    t = CompactToken()
+    for k, v in token.items():
+        t[k] = intern_value(v)
+    return t
+
+
+def parse_compact_token(line):
+    values = parse_values(line)
+    if values is None:
+        return compact_token(parse_token(line))
+    t = CompactToken()
+    (
+        t.id,
+        t.form,
+        t.lemma,
+        t.upos,
+        t.xpos,
+        t.feats,
+        t.head,
+        t.deprel,
+        t.deps,
+        t.misc,
+    ) = [intern_value(v) for v in values]
+    return t
+
+
+def compact(sentence):
+    """Converts a sentence to compact tokens with interned strings."""
+    return CompactSentence(
+        [compact_token(t) for t in sentence],
+        Metadata((sys.intern(k), v) for k, v in sentence.metadata.items()),
+        sentence.default_fields,
+    )
+
+
+def parse_block(block, compact=False):
+    """Parses the lines of a sentence, yielding the same result as conllu.
+
+    Token lines with the default fields take a fast path, others are parsed
+    via conllu's generic line parser. Optionally, tokens are parsed into
+    their compact representation.
+    """
+    metadata = Metadata()
+    tokens = []
+    for line in block:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            if line.startswith("# global.columns"):
+                raise ValueError("CoNLL-U Plus columns are not supported")
+            for k, v in parse_comment_line(line):
+                metadata[k] = v
+        else:
+            tokens.append(parse_compact_token(line) if compact else parse_token(line))
+    sentence_type = CompactSentence if compact else TokenList
+    return sentence_type(tokens, metadata, default_fields=list(DEFAULT_FIELDS))
+
+
+def parse_incr(lines, compact=False):
+    """Lazily parses sentences from a CoNLL-U file or an iterable of lines."""
+    for block in read_blocks(lines):
+        yield parse_block(block, compact)
+
+
+def parse(data, compact=False):
+    return list(parse_incr(io.StringIO(data), compact))
+
+
+def pack_sentences(sentences):
+    """Compact representation of sentences, i. e. for inter-process transport.
+
+    Tokens become tuples of field values with the field names stored once per
+    sentence, which is smaller and faster to (un-)pickle than token dicts.
+    Sentences with varying fields per token are kept as they are.
+    """
+    packed = []
+    for s in sentences:
+        fields = tuple(s[0]) if s else ()
+        if not all(tuple(t) == fields for t in s):
+            packed.append(s)
+            continue
+        packed.append(
+            (
+                tuple(s.metadata.items()) if s.metadata else (),
+                fields,
+                [tuple(t.values()) for t in s],
+                s.default_fields,
+            )
+        )
+    return packed
+
+
+def unpack_sentences(packed):
+    sentences = []
+    for s in packed:
+        if isinstance(s, TokenList):
+            sentences.append(s)
+            continue
+        metadata, fields, tokens, default_fields = s
+        sentences.append(
+            TokenList(
+                [Token(zip(fields, t)) for t in tokens],
+                Metadata(metadata),
+                default_fields,
+            )
+        )
+    return sentences
@@ -0,0 +1,128 @@
+"""Block-compressed gzip files, in the style of BGZF.
+
+Files consist of independently compressed gzip members of limited size,
+each recording its compressed size in a header field. They remain valid
+gzip streams, while ranges of blocks can be located and decompressed on
+their own, i. e. for random access to documents or parallel readers.
+
+Positions in the uncompressed text are given as virtual offsets, combining
+the compressed offset of a block (upper 48 bits) with an offset within the
+block's uncompressed data (lower 16 bits).
+"""
+
+import gzip
+import struct
+import zlib
+
+# uncompressed bytes per block, leaving room for incompressible data
+max_block_size = 0xFF00
+
+# ID1 ID2 CM FLG MTIME XFL OS XLEN, extra subfield "BC" with the block size
+_header = struct.Struct("<4BI2BH2B2H")
+_trailer = struct.Struct("<2I")
+
+
+def compress_block(data):
+    # maximum compression, like gzip's default
+    compressor = zlib.compressobj(level=9, wbits=-15)
+    deflated = compressor.compress(data) + compressor.flush()
+    block_size = _header.size + len(deflated) + _trailer.size
+    return b"".join(
+        (
+            _header.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, block_size - 1),
+            deflated,
+            _trailer.pack(zlib.crc32(data), len(data) & 0xFFFFFFFF),
+        )
+    )
+
+
+eof_block = compress_block(b"")
+
+
+class Writer:
+    """Writes text in blocks, keeping each write within a block if it fits."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+        self.buffer = []
+        self.size = 0
+
+    def tell(self):
+        return self.offset << 16 | self.size
+
+    def write(self, s):
+        """Writes text; returns its virtual offset and its size in bytes."""
+        data = s.encode("utf-8")
+        if self.size + len(data) > max_block_size:
+            self.flush()
+        offset = self.tell()
+        for start in range(0, len(data), max_block_size):
+            chunk = data[start : start + max_block_size]
+            self.buffer.append(chunk)
+            self.size += len(chunk)
+            if self.size >= max_block_size:
+                self.flush()
+        return offset, len(data)
+
+    def flush(self):
+        if self.buffer:
+            block = compress_block(b"".join(self.buffer))
+            self.f.write(block)
+            self.offset += len(block)
+            self.buffer = []
+            self.size = 0
+
+    def close(self):
+        self.flush()
+        self.f.write(eof_block)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def block_offsets(f):
+    """Offsets of all blocks in a file, read from their headers only."""
+    offset = f.seek(0)
+    while header := f.read(_header.size):
+        *_, si1, si2, _slen, block_size = _header.unpack(header)
+        if (si1, si2) != (66, 67):
+            raise ValueError(f"Not a block-compressed file (@{offset:,d})")
+        yield offset
+        offset += block_size + 1
+        f.seek(offset)
+
+
+def split(f, n):
+    """Splits a file into up to n ranges of whole blocks, i. e. for parallel reads.
+
+    Blocks end on sentence boundaries unless a sentence exceeds a block.
+    """
+    offsets = list(block_offsets(f))
+    end = f.seek(0, 2)
+    starts = sorted(
+        {offsets[len(offsets) * i // n] for i in range(n)} if offsets else ()
+    )
+    return list(zip(starts, starts[1:] + [end]))
+
+
+def decompress(f, start, stop):
+    """Decompresses the blocks within a range of compressed offsets."""
+    f.seek(start)
+    return gzip.decompress(f.read(stop - start)).decode("utf-8")
+
+
+def read(f, offset, size):
+    """Reads text of a given size in bytes, starting at a virtual offset."""
+    f.seek(offset >> 16)
+    skip = offset & 0xFFFF
+    blocks = []
+    n = -skip
+    while n < size and (header := f.read(_header.size)):
+        block_size = _header.unpack(header)[-1] + 1
+        blocks.append(gzip.decompress(header + f.read(block_size - _header.size)))
+        n += len(blocks[-1])
+    return b"".join(blocks)[skip : skip + size].decode("utf-8")
@@ -1,5 +1,4 @@
 import argparse
-import gzip
 import itertools
 import multiprocessing as mp
 import sqlite3
@@ -8,14 +7,13 @@ from datetime import UTC, datetime
 from itertools import batched, tee
 from pathlib import Path
 from random import random
-from time import time
-
-import conllu
 
 from ..annotate import create_pipe
-from ..conllu import serialize
+from ..conllu import parse, serialize
 from ..log import logger
 from ..tei import to_conll
+from . import bgzf
+from .manifest import write_manifest
 from .sources import find_corpora, find_corpus_sources
 
 arg_parser = argparse.ArgumentParser(description="Convert and annotate ZDL corpora")
@@ -51,6 +49,12 @@ arg_parser.add_argument(
     help="comma-separated id list of GPUs to use for NLP annotation",
     nargs="*",
 )
+arg_parser.add_argument(
+    "-L",
+    "--nlp-doc-lang",
+    help="Detect languages per document during NLP annotation",
+    action="store_true",
+)
 arg_parser.add_argument(
     "-P",
     "--nlp-parallel",
@@ -65,44 +69,6 @@ arg_parser.add_argument(
     "target_dir", help="target dir with annotated source i CoNLL-U format", type=Path
 )
 
-_init_manifest_sql = (
-    (
-        "CREATE TABLE IF NOT EXISTS document ("
-        "corpus VARCHAR(32) NOT NULL,"
-        "path VARCHAR(128) NOT NULL,"
-        "digest CHAR(64) NOT NULL,"
-        "imported INTEGER NOT NULL,"
-        "import_path VARCHAR(64) NOT NULL"
-        ")"
-    ),
-)
-
-
-def write_manifest(db_file, q):
-    with closing(sqlite3.connect(db_file, autocommit=True)) as db:
-        logger.info("Initializing manifest database")
-        for stmt in _init_manifest_sql:
-            logger.debug(stmt)
-            db.execute(stmt)
-
-        while entry := q.get():
-            if len(entry) == 2:
-                corpus, path = entry
-                db.execute(
-                    "UPDATE document SET imported = ? WHERE corpus = ? and path = ?",
-                    (int(time()), corpus, path),
-                )
-            else:
-                corpus, path, digest, import_path = entry
-                db.execute(
-                    (
-                        "INSERT INTO document "
-                        "(corpus, path, digest, imported, import_path) "
-                        "VALUES (?, ?, ?, ?, ?)"
-                    ),
-                    (corpus, path, digest, int(time()), import_path),
-                )
-
 
 def to_conll_str(document):
     corpus, path, xml_file, digest = document
@@ -133,6 +99,7 @@ def main():
             gpus=tuple(args.nlp_gpu or []),
             batch_size=args.nlp_batch_size,
             n_procs=args.nlp_parallel,
+            doc_lang=args.nlp_doc_lang,
         )
         corpora = sorted(find_corpora(args.source_dir))
         for corpus, source_dir in corpora:
@@ -170,7 +137,7 @@ def main():
                 sentences = (
                     (path, digest, sentence)
                     for path, xml_file, digest, conll_str in files
-                    for sentence in conllu.parse(conll_str)
+                    for sentence in parse(conll_str)
                 )
                 s_mult = tee(sentences, 2)
                 files = ((path, digest) for path, digest, _ in s_mult[0])
@@ -178,28 +145,32 @@ def main():
 
                 file_path = None
                 file_digest = None
-                file_content = []
+                file_docs = []
                 for f, s in zip(files, sentences):
                     path, digest = f
                     if file_path != path:
-                        if file_content:
-                            file_content = "".join(serialize(s) for s in file_content)
-                            yield file_path, file_digest, file_content
+                        if file_docs:
+                            yield file_path, file_digest, file_docs
                         file_path = path
                         file_digest = digest
-                        file_content = []
-                    file_content.append(s)
-                if file_content:
-                    file_content = "".join(serialize(s) for s in file_content)
-                    yield file_path, file_digest, file_content
+                        file_docs = []
+                    if not file_docs or "newdoc id" in s.metadata:
+                        file_docs.append((s.metadata.get("newdoc id", path), []))
+                    file_docs[-1][1].append(serialize(s))
+                if file_docs:
+                    yield file_path, file_digest, file_docs
 
             batches = batched(annotated_files(), 1024)
             for batch_n, batch in enumerate(batches):
                 conll_file = bucket_dir / f"{batch_n:010d}.{corpus}.conll.gz"
-                with gzip.open(conll_file, "wt") as cf:
-                    for _, _, conll_str in batch:
-                        cf.write(conll_str)
                 conll_file_str = str(conll_file.relative_to(args.target_dir))
+                with conll_file.open("wb") as f, bgzf.Writer(f) as cf:
+                    for path, _, docs in batch:
+                        for doc_id, doc_sentences in docs:
+                            offset, size = cf.write(doc_sentences[0])
+                            for s in doc_sentences[1:]:
+                                size += cf.write(s)[1]
+                            db_queue.put((doc_id, path, conll_file_str, offset, size))
                 for path, digest, _ in batch:
                     db_queue.put((corpus, path, digest, conll_file_str))
     db_queue.put(None)
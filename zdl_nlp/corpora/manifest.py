@@ -0,0 +1,103 @@
+import sqlite3
+from contextlib import closing
+from time import time
+
+from ..log import logger
+from . import bgzf
+
+_init_manifest_sql = (
+    (
+        "CREATE TABLE IF NOT EXISTS document ("
+        "corpus VARCHAR(32) NOT NULL,"
+        "path VARCHAR(128) NOT NULL,"
+        "digest CHAR(64) NOT NULL,"
+        "imported INTEGER NOT NULL,"
+        "import_path VARCHAR(64) NOT NULL"
+        ")"
+    ),
+    (
+        "CREATE TABLE IF NOT EXISTS document_block ("
+        "doc_id VARCHAR(256) NOT NULL,"
+        "path VARCHAR(128) NOT NULL,"
+        "import_path VARCHAR(64) NOT NULL,"
+        "offset INTEGER NOT NULL,"  # virtual offset, see bgzf
+        "size INTEGER NOT NULL"
+        ")"
+    ),
+    "CREATE INDEX IF NOT EXISTS document_block_doc_id ON document_block (doc_id)",
+    "CREATE INDEX IF NOT EXISTS document_block_path ON document_block (path)",
+)
+
+
+def write_manifest(db_file, q):
+    with closing(sqlite3.connect(db_file, autocommit=True)) as db:
+        logger.info("Initializing manifest database")
+        for stmt in _init_manifest_sql:
+            logger.debug(stmt)
+            db.execute(stmt)
+
+        while entry := q.get():
+            if len(entry) == 2:
+                corpus, path = entry
+                db.execute(
+                    "UPDATE document SET imported = ? WHERE corpus = ? and path = ?",
+                    (int(time()), corpus, path),
+                )
+            elif len(entry) == 5:
+                db.execute(
+                    (
+                        "INSERT INTO document_block "
+                        "(doc_id, path, import_path, offset, size) "
+                        "VALUES (?, ?, ?, ?, ?)"
+                    ),
+                    entry,
+                )
+            else:
+                corpus, path, digest, import_path = entry
+                db.execute(
+                    (
+                        "INSERT INTO document "
+                        "(corpus, path, digest, imported, import_path) "
+                        "VALUES (?, ?, ?, ?, ?)"
+                    ),
+                    (corpus, path, digest, int(time()), import_path),
+                )
+
+
+def find_document(db, doc_id=None, path=None):
+    """Bucket and byte ranges of the latest import of a document/source file.
+
+    Ranges are returned individually in the order they were written, as the
+    blocks of a document are not necessarily contiguous within a bucket, e. g.
+    for document IDs occurring in several source files.
+    """
+    k, v = ("doc_id", doc_id) if doc_id is not None else ("path", path)
+    latest = db.execute(
+        (
+            f"SELECT import_path FROM document_block WHERE {k} = ? "
+            "ORDER BY rowid DESC LIMIT 1"
+        ),
+        (v,),
+    ).fetchone()
+    if latest is None:
+        return None
+    (import_path,) = latest
+    ranges = db.execute(
+        (
+            "SELECT offset, size FROM document_block "
+            f"WHERE {k} = ? AND import_path = ? ORDER BY rowid"
+        ),
+        (v, import_path),
+    ).fetchall()
+    return import_path, ranges
+
+
+def read_document(target_dir, doc_id=None, path=None):
+    """CoNLL-U of a document/source file, decompressing only the blocks it spans."""
+    with closing(sqlite3.connect(target_dir / "manifest.db")) as db:
+        location = find_document(db, doc_id, path)
+    if location is None:
+        return None
+    import_path, ranges = location
+    with (target_dir / import_path).open("rb") as f:
+        return "".join(bgzf.read(f, offset, size) for offset, size in ranges)
@@ -0,0 +1,146 @@
+import argparse
+import io
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+from time import perf_counter
+
+from .conllu import parse_incr, serialize
+from .env import config
+from .log import logger
+
+# CoNLL-U is followed by a status line, separated by a byte not found in text
+status_separator = b"\0"
+
+
+class AnnotationHandler(socketserver.StreamRequestHandler):
+    """Streams CoNLL-U sentences of a client through the server's pipe.
+
+    Annotated sentences are followed by a status line: `ok` or the error,
+    which stopped the pipe.
+    """
+
+    def handle(self):
+        start = perf_counter()
+        n_sentences = 0
+        sentences = parse_incr(io.TextIOWrapper(self.rfile, encoding="utf-8"))
+        try:
+            try:
+                for s in self.server.pipe(sentences):
+                    self.wfile.write(serialize(s).encode("utf-8"))
+                    n_sentences += 1
+                status = "ok"
+            except Exception as e:
+                logger.exception("Annotation failed")
+                status = f"error: {e!r}"
+            self.wfile.write(status_separator + f"{status}\n".encode("utf-8"))
+        except BrokenPipeError:
+            logger.warning("Client disconnected")
+        logger.info(
+            f"Annotated {n_sentences:,d} sentences in {perf_counter() - start:.2f}s"
+        )
+
+
+class AnnotationServer(socketserver.UnixStreamServer):
+    """Serves requests one at a time, sharing a warm annotation pipe."""
+
+    def __init__(self, socket_path, pipe):
+        self.pipe = pipe
+        super().__init__(socket_path, AnnotationHandler)
+
+
+def serve(socket_path, pipe):
+    if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        os.unlink(socket_path)
+    with AnnotationServer(socket_path, pipe) as server:
+        logger.info(f"Serving annotation requests via {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+
+class AnnotationError(Exception):
+    pass
+
+
+def annotate(socket_path, input_file, output_file, chunk_size=65536):
+    """Sends CoNLL-U input to a server, writing annotated CoNLL-U as received.
+
+    Raises an `AnnotationError`, if the server reports an error or the
+    annotated CoNLL-U is incomplete.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+
+        def send():
+            # failing servers stop reading, reporting their errors as status
+            try:
+                while chunk := input_file.read(chunk_size):
+                    sock.sendall(chunk)
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        status = None
+        while chunk := sock.recv(chunk_size):
+            if status is None:
+                chunk, separator, rest = chunk.partition(status_separator)
+                output_file.write(chunk)
+                if separator:
+                    status = rest
+            else:
+                status += chunk
+        output_file.flush()
+        sender.join()
+    if status is None:
+        raise AnnotationError("Incomplete annotations, server disconnected")
+    status = status.decode("utf-8").strip()
+    if status != "ok":
+        raise AnnotationError(f"Annotation failed on the server ({status})")
+
+
+arg_parser = argparse.ArgumentParser(
+    description="Add linguistic annotations via a running annotation server"
+)
+arg_parser.add_argument(
+    "-i",
+    "--input-file",
+    help="input CoNLL-U file to annotate (stdin by default)",
+    type=argparse.FileType("rb"),
+    default="-",
+)
+arg_parser.add_argument(
+    "-o",
+    "--output-file",
+    help="output CoNLL-U file with (updated) annotations (stdout by default)",
+    type=argparse.FileType("wb"),
+    default="-",
+)
+arg_parser.add_argument(
+    "-s",
+    "--socket",
+    help="Unix socket of the server (started via 'zdl-nlp-annotate --serve')",
+    default=config.get("ZDL_NLP_ANNOTATE_SOCKET"),
+)
+
+
+def main():
+    args = arg_parser.parse_args()
+    if not args.socket:
+        arg_parser.error("no server socket given")
+    try:
+        annotate(args.socket, args.input_file, args.output_file)
+    except AnnotationError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ from .dedupe import dedupe
 from .env import config
 from .korap import korap_instances
 from .log import logger
+from .utils import size_batched
 
 _quotes_re = re.compile(r"(['\"])")
 
@@ -102,11 +103,22 @@ def main():
     korap_limit = int(config.get("ZDL_NLP_KORAP_QUERY_LIMIT", "100"))
 
     nlp_batch_size = int(config.get("ZDL_NLP_BATCH_SIZE", "128"))
+    nlp_batch_tokens = int(config.get("ZDL_NLP_BATCH_TOKENS", "0"))
     nlp_parallel = int(config.get("ZDL_NLP_PARALLEL", "-1"))
     nlp_gpus_config = config.get("ZDL_NLP_GPU_IDS", "")
     nlp_gpus = tuple(int(g.strip()) for g in nlp_gpus_config.split(",") if g)
 
-    nlp = create_pipe(gpus=nlp_gpus, batch_size=nlp_batch_size, n_procs=nlp_parallel)
+    nlp_cache_file = config.get("ZDL_NLP_ANNOTATION_CACHE")
+    nlp_cache_size = int(config.get("ZDL_NLP_ANNOTATION_CACHE_SIZE", "1000000"))
+
+    nlp = create_pipe(
+        gpus=nlp_gpus,
+        batch_size=nlp_batch_size,
+        batch_tokens=nlp_batch_tokens,
+        n_procs=nlp_parallel,
+        cache_file=nlp_cache_file,
+        cache_size=nlp_cache_size,
+    )
 
     wic_tf = WiCTransformer.load()
 
@@ -120,7 +132,11 @@ def main():
         sentences = dedupe(sentences, filter_duplicates=True)
         sentences = (fix_korap_hits(s, lemma_set) for s in sentences)
 
-        for s_batch in batched(sentences, 32):
+        if nlp_batch_tokens > 0:
+            s_batches = size_batched(sentences, nlp_batch_tokens, len, 32)
+        else:
+            s_batches = batched(sentences, 32)
+        for s_batch in s_batches:
             embeddings = wic_tf.encode(
                 [marked_text(s) for s in s_batch],
                 batch_size=nlp_batch_size,
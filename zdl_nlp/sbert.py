@@ -5,11 +5,11 @@ import logging
 import warnings
 from typing import Dict, List, Tuple, Union
 
-import conllu
 from sentence_transformers import SentenceTransformer
 from torch import tensor
 
-from .conllu import marked_text, serialize
+from .conllu import marked_text, parse_incr, serialize
+from .utils import size_batched
 
 start_tag = "<t>"
 end_tag = "</t>"
@@ -31,19 +31,14 @@ class WordTransformer(SentenceTransformer):
         assert self.tokenizer.num_special_tokens_to_add() == 2
         self.max_token_length -= 2
 
+        # subword units of texts sized for batching, pending their encoding
+        self.tokenized = {}
+
     def tokenize(self, texts: Union[List[str], List[Dict], List[Tuple[str, str]]]):
         tokenizer = self.tokenizer
         tokens = list()
         for text in texts:
-            tokenized = tokenizer(
-                text,
-                add_special_tokens=False,
-                return_attention_mask=False,
-                verbose=False,
-            )
-            token_ids = tokenized["input_ids"]
-            if len(token_ids) > self.max_token_length:
-                token_ids = self.center_wic(token_ids)
+            token_ids = self.tokenized.pop(text, None) or self.token_ids(text)
             token_ids.insert(0, tokenizer.cls_token_id)
             token_ids.append(tokenizer.sep_token_id)
             tokens.append(token_ids)
@@ -60,6 +55,26 @@ class WordTransformer(SentenceTransformer):
             "attention_mask": tensor(attention_mask),
         }
 
+    def token_ids(self, text):
+        """Subword units of a text, centered on the marked word if too long."""
+        token_ids = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_attention_mask=False,
+            verbose=False,
+        )["input_ids"]
+        if len(token_ids) > self.max_token_length:
+            token_ids = self.center_wic(token_ids)
+        return token_ids
+
+    def token_length(self, text):
+        """# of subword units of a text, as passed to the model.
+
+        The subword units are kept until the text is tokenized for encoding.
+        """
+        token_ids = self.tokenized[text] = self.token_ids(text)
+        return len(token_ids) + 2
+
     def center_wic(self, token_ids):
         start_wic = token_ids.index(self.start_tag_id)
         end_wic = token_ids.index(self.end_tag_id) + 1
@@ -91,16 +106,28 @@ def word_transformer(quantized=False):
         return WordTransformer(model, backend=backend)
 
 
-def embed(word_tf, sentences, batch_size=100):
-    for batch in itertools.batched(sentences, batch_size):
-        texts = [marked_text(s) for s in batch]
-        embeddings = word_tf.encode(texts, batch_size=batch_size)
-        for embedding, sentence in zip(embeddings, batch):
+def embed(word_tf, sentences, batch_size=100, batch_tokens=0):
+    texts = ((marked_text(s), s) for s in sentences)
+    if batch_tokens > 0:
+        batches = size_batched(
+            texts, batch_tokens, lambda t: word_tf.token_length(t[0]), batch_size
+        )
+    else:
+        batches = itertools.batched(texts, batch_size)
+    for batch in batches:
+        embeddings = word_tf.encode([t for t, _ in batch], batch_size=len(batch))
+        for embedding, (_, sentence) in zip(embeddings, batch):
             sentence.metadata["wic-embedding"] = json.dumps(embedding.tolist())
             yield sentence
 
 
 arg_parser = argparse.ArgumentParser(description="Add WiC sentence embeddings")
+arg_parser.add_argument(
+    "--batch-tokens",
+    help="max. # of subword units per batch (0/no limit by default)",
+    type=int,
+    default="0",
+)
 arg_parser.add_argument(
     "-i",
     "--input-file",
@@ -120,8 +147,8 @@ arg_parser.add_argument(
 def main():
     args = arg_parser.parse_args()
     word_tf = word_transformer()
-    sentences = conllu.parse_incr(args.input_file)
-    for s in embed(word_tf, sentences, batch_size=32):
+    sentences = parse_incr(args.input_file)
+    for s in embed(word_tf, sentences, batch_size=32, batch_tokens=args.batch_tokens):
         args.output_file.write(serialize(s))
 
 
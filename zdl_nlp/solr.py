@@ -1,15 +1,16 @@
 import argparse
 import itertools
 import json
-from collections import defaultdict
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 
-import conllu
+import backoff
 import requests
-from lxml import etree as ET
-from lxml.builder import ElementMaker
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
-from .conllu import is_space_after
+from .conllu import is_space_after, parse_block, read_docs
 
 arg_parser = argparse.ArgumentParser(description="Index annotated texts")
 arg_parser.add_argument(
@@ -29,6 +30,18 @@ arg_parser.add_argument(
     type=argparse.FileType("r"),
     default="-",
 )
+arg_parser.add_argument(
+    "--max-in-flight",
+    help="# of concurrent update requests (4 by default)",
+    type=int,
+    default="4",
+)
+arg_parser.add_argument(
+    "--max-tries",
+    help="# of tries per update while Solr is unavailable (8 by default)",
+    type=int,
+    default="8",
+)
 arg_parser.add_argument("--progress", help="Show progress", action="store_true")
 arg_parser.add_argument(
     "--solr-host",
@@ -48,19 +61,53 @@ arg_parser.add_argument(
 )
 
 
-def index_update(solr_url, solr_core, update_xml):
-    r = requests.post(
-        f"{solr_url}/solr/{solr_core}/update",
-        headers={"Content-Type": "text/xml"},
-        params={"wt": "json"},
-        data=ET.tostring(update_xml, encoding="unicode").encode("utf-8"),
+def session(pool_size):
+    """HTTP session keeping up to `pool_size` connections to Solr alive."""
+    s = requests.Session()
+    s.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    return s
+
+
+def is_unavailable(e):
+    if isinstance(e, requests.ConnectionError):
+        return True
+    return e.response is not None and e.response.status_code == 503
+
+
+def index_update(solr_url, solr_core, update, http=requests, max_tries=1):
+    """Posts an update, given as a function generating its XML in chunks of bytes.
+
+    The chunks are streamed as the request body; on retries, the update is
+    generated anew.
+    """
+
+    @backoff.on_exception(
+        backoff.expo,
+        requests.RequestException,
+        max_tries=max_tries,
+        giveup=lambda e: not is_unavailable(e),
     )
-    r.raise_for_status()
-    return r.json()
+    def post():
+        chunks = update()
+        try:
+            r = http.post(
+                f"{solr_url}/solr/{solr_core}/update",
+                headers={"Content-Type": "text/xml"},
+                params={"wt": "json"},
+                data=chunks,
+            )
+        finally:
+            # also when the request failed before the update was consumed
+            chunks.close()
+        r.raise_for_status()
+        return r.json()
 
+    return post()
 
-def index_clear(solr_url, solr_core):
-    index_update(solr_url, solr_core, E.delete(E.query("*:*")))
+
+def index_clear(solr_url, solr_core, http=requests):
+    index_update(solr_url, solr_core, lambda: xml_delete("*:*"), http)
 
 
 stored_trans = str.maketrans({"=": r"\="})
@@ -86,19 +133,44 @@ def stored(s):
     return f"={s.translate(stored_trans)}="
 
 
-E = ElementMaker()
+xml_trans = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#13;"})
+
+
+def xml_field(k, v):
+    return f'<field name="{k}">{str(v).translate(xml_trans)}</field>'
+
 
+def xml_add(docs, chunk_size=0x10000):
+    """XML update adding Solr documents, encoded in chunks of about `chunk_size`."""
+    chunk = ["<add>"]
+    size = 0
+    for fields in docs:
+        doc = "".join([xml_field(k, v) for k, v in fields])
+        chunk.append(f"<doc>{doc}</doc>")
+        size += len(chunk[-1])
+        if size >= chunk_size:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+            size = 0
+    chunk.append("</add>")
+    yield "".join(chunk).encode("utf-8")
 
-def doc_field(k, v):
-    return E.field({"name": k}, str(v))
 
+def xml_delete(query):
+    query = query.translate(xml_trans)
+    yield f"<delete><query>{query}</query></delete>".encode("utf-8")
 
-def index(solr_url, solr_core, batch):
-    index_docs = []
+
+def update_docs(batch):
+    """Converts a batch of documents into Solr documents, one per sentence.
+
+    Documents are generated lazily as tuples of fields, so that an update can
+    be streamed without holding all of its documents in memory.
+    """
     for doc in batch:
         meta_fields = []
         pn = 1
-        for sn, s in enumerate(conllu.parse(doc), 1):
+        for sn, s in enumerate(map(parse_block, doc), 1):
             md = s.metadata
             lemmata = defaultdict(list)
             for ti, t in enumerate(s, 1):
@@ -126,17 +198,17 @@ def index(solr_url, solr_core, batch):
                         collocations[t1].append((f"c#{label}_", f"{l2}#{l1}"))
                         collocations[t2].append((f"c#{label}_", f"{l2}#{l1}"))
             s_len = len(s)
-            content = ""
+            content = []
             content_len = 0
             tokens = []
             for ti, t in enumerate(s, 1):
                 start = content_len
                 form = t.get("form", "")
-                content += form
+                content.append(form)
                 content_len += len(form)
                 end = content_len
                 if not ti == s_len and is_space_after(t):
-                    content += " "
+                    content.append(" ")
                     content_len += 1
                 token_se = f"s={start},e={end}"
                 tokens.append(f"{token(form)},i=1,{token_se}")
@@ -187,7 +259,7 @@ def index(solr_url, solr_core, batch):
                 ("id", f"{doc_urn}#{sn}"),
                 ("p_i", str(pn)),
                 ("s_i", str(sn)),
-                ("text_pre", f"1 {stored(content)} {' '.join(tokens)}"),
+                ("text_pre", f"1 {stored(''.join(content))} {' '.join(tokens)}"),
             ]
 
             def sentence_field(k, v, sentence_fields=sentence_fields):
@@ -199,27 +271,14 @@ def index(solr_url, solr_core, batch):
             sentence_field("gdex_b", float(gdex) >= 0.5 if gdex else None)
             sentence_field("lang_s", md.get("lang"))
 
-            index_docs.append(
-                E.doc(
-                    *(doc_field(k, v) for k, v in sentence_fields),
-                    *(doc_field(k, v) for k, v in meta_fields),
-                )
-            )
-    index_update(solr_url, solr_core, E.add(*index_docs))
-    return len(index_docs)
+            yield (*sentence_fields, *meta_fields)
 
 
-def read_docs(lines):
-    doc = ""
-    for line in lines:
-        if line.startswith("# newdoc id"):
-            if doc:
-                yield doc
-            doc = line
-        else:
-            doc += line
-    if doc:
-        yield doc
+def index(solr_url, solr_core, batch, http=requests, max_tries=1):
+    index_update(
+        solr_url, solr_core, lambda: xml_add(update_docs(batch)), http, max_tries
+    )
+    return sum(len(doc) for doc in batch)
 
 
 def main():
@@ -234,15 +293,39 @@ def main():
             unit_scale=True,
             smoothing=0.01,
         )
+    http = session(args.max_in_flight)
     if args.clear:
-        index_clear(solr_url, solr_core)
-    docs = read_docs(args.input_file)
-    batches = itertools.batched(docs, args.batch_size)
-    batches = (index(solr_url, solr_core, batch) for batch in batches)
-    for docs_updated in batches:
+        index_clear(solr_url, solr_core, http)
+
+    # one update is converted at a time, while the others wait for Solr
+    converting = threading.Lock()
+
+    def update(batch):
+        with converting:
+            yield from xml_add(update_docs(batch))
+
+    def post(batch):
+        index_update(solr_url, solr_core, lambda: update(batch), http, args.max_tries)
+        return sum(len(doc) for doc in batch)
+
+    def done(future):
+        docs_updated = future.result()
         if progress is not None:
             progress.update(docs_updated)
 
+    # reads the next batch while previous updates are in flight
+    with ThreadPoolExecutor(args.max_in_flight) as executor:
+        in_flight = deque()
+        docs = read_docs(args.input_file)
+        for batch in itertools.batched(docs, args.batch_size):
+            in_flight.append(executor.submit(post, batch))
+            while in_flight and (
+                len(in_flight) >= args.max_in_flight or in_flight[0].done()
+            ):
+                done(in_flight.popleft())
+        while in_flight:
+            done(in_flight.popleft())
+
 
 if __name__ == "__main__":
     main()
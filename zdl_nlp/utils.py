@@ -15,6 +15,27 @@ def look_ahead(iterable):
         yield (el, None)
 
 
+def size_batched(iterable, max_size, size=len, max_n=0):
+    """Batches items up to a total size and, if max_n > 0, a # of items.
+
+    Items exceeding max_size on their own are batched alone.
+    """
+    batch = []
+    batch_size = 0
+    for item in iterable:
+        item_size = size(item)
+        if batch and (
+            batch_size + item_size > max_size or (max_n > 0 and len(batch) >= max_n)
+        ):
+            yield tuple(batch)
+            batch = []
+            batch_size = 0
+        batch.append(item)
+        batch_size += item_size
+    if batch:
+        yield tuple(batch)
+
+
 def norm_str(s):
     s = s.strip() if s else ""
     return s if s else None